@@ -0,0 +1,48 @@
+from functools import lru_cache
+from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Application settings read once from the environment and .env, with types parsed up front"""
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+    
+    # Server
+    host: str = "0.0.0.0"
+    port: int = 8000
+    debug: bool = True
+    workers: Optional[int] = None  # Defaults to the CPU count when debug is off
+    thread_pool_size: Optional[int] = None
+    
+    # OpenAI
+    openai_api_key: Optional[str] = None
+    embedding_model: str = "text-embedding-3-small"
+    # Schemas with at least this many tables get only the tables a question refers to in the prompt
+    table_selection_min_tables: int = 40
+    
+    # Caching
+    sql_cache_ttl: int = 600
+    semantic_cache: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_ttl: float = 3600
+    # Empty to keep semantic-cache entries in memory only
+    semantic_cache_path: str = "~/.cache/sql_agent/semantic_cache.db"
+    semantic_cache_sync_interval: float = 5
+    
+    # Database
+    db_host: str = "localhost"
+    db_port: int = 3306
+    db_user: str = "root"
+    db_password: str = ""
+    db_name: str = "Salesforce"
+    use_sqlite: bool = False
+    db_pool_min: int = 2
+    db_pool_max: int = 10
+    schema_cache_ttl: int = 300
+    query_cache_ttl: int = 60
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Return the process-wide settings instance"""
+    return Settings()
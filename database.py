@@ -1,144 +1,357 @@
 import pymysql
 import sqlite3
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import atexit
+import hashlib
+import pickle
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dbutils.pooled_db import PooledDB
+from cachetools import TTLCache
+
+from config import Settings, get_settings
+
+# Leading keyword of a statement, after any opening parentheses
+_FIRST_KEYWORD_RE = re.compile(r'[\s(]*([A-Za-z]+)')
+
+# MySQL statements that only read; anything else that returns rows (CALL, MariaDB's RETURNING) may write
+_MYSQL_READS = frozenset({'SELECT', 'WITH', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN', 'TABLE', 'VALUES'})
+
+
+def _intern_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Intern table names and column fields so every lookup against them hits the identity fast path"""
+    return {
+        sys.intern(table_name): [{field: sys.intern(value) if isinstance(value, str) else value
+                                  for field, value in col.items()} for col in columns]
+        for table_name, columns in schema.items()
+    }
+
 
 class DatabaseManager:
-    def __init__(self):
-        self.host = os.getenv("DB_HOST", "localhost")
-        self.port = int(os.getenv("DB_PORT", 3306))
-        self.user = os.getenv("DB_USER", "root")
-        self.password = os.getenv("DB_PASSWORD", "")
-        self.database = os.getenv("DB_NAME", "Salesforce")
-        self.use_sqlite = os.getenv("USE_SQLITE", "False").lower() == "true"
-        self.executor = ThreadPoolExecutor(max_workers=4)
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.host = settings.db_host
+        self.port = settings.db_port
+        self.user = settings.db_user
+        self.password = settings.db_password
+        self.database = settings.db_name
+        self.use_sqlite = settings.use_sqlite
+        self._schema_ttl = settings.schema_cache_ttl
+        self._schema_cache = None  # (monotonic timestamp, schema dict)
+        self._sample_cache = None  # (monotonic timestamp, sample data dict)
+        self._schema_lock = asyncio.Lock()
+        self._sample_lock = asyncio.Lock()
+        self._query_cache = TTLCache(maxsize=512, ttl=settings.query_cache_ttl)
+        self._schema_cache_path = os.path.join(os.path.expanduser("~"), ".cache", "sql_agent", "schema.pkl")
+        # Touched by invalidate_schema; every worker compares its mtime before serving cached data
+        self._invalidation_path = os.path.join(os.path.dirname(self._schema_cache_path), "invalidated")
+        self._invalidation_stamp = self._read_invalidation_stamp()
+        self._pool_min = settings.db_pool_min
+        self._pool_max = settings.db_pool_max
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._tls = threading.local()
+        self._sqlite_connections = []
+        self._sqlite_lock = threading.Lock()
+        atexit.register(self.close)
+    
+    def _get_pool(self) -> PooledDB:
+        """Lazily create the MySQL connection pool"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = PooledDB(
+                        creator=pymysql,
+                        mincached=self._pool_min,
+                        maxcached=self._pool_max,
+                        maxconnections=self._pool_max,
+                        blocking=True,
+                        ping=1,
+                        host=self.host,
+                        port=self.port,
+                        user=self.user,
+                        password=self.password,
+                        database=self.database,
+                        charset='utf8mb4',
+                        cursorclass=pymysql.cursors.DictCursor
+                    )
+        return self._pool
+    
+    def _open_sqlite(self) -> sqlite3.Connection:
+        """Open and tune a SQLite connection for the calling worker thread"""
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # This makes rows dict-like
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")  # ~64MB page cache
+        self._tls.conn = conn
+        with self._sqlite_lock:
+            self._sqlite_connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close cached SQLite connections and the MySQL pool"""
+        with self._sqlite_lock:
+            for conn in self._sqlite_connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._sqlite_connections.clear()
+        self._tls = threading.local()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+    
+    @contextmanager
+    def get_connection(self):
+        """Borrow a pooled MySQL connection; closing it returns it to the pool"""
+        connection = self._get_pool().connection()
+        try:
+            yield connection
+        finally:
+            connection.close()
     
     async def execute_query(self, sql: str) -> List[Dict[str, Any]]:
         """Execute SQL query and return results as list of dictionaries"""
+        # Repeated reads are served from a short-lived result cache; only statements
+        # that changed nothing are ever stored, so writes always miss
+        self.schema_version()
+        # Keyed on the statement as written apart from surrounding whitespace; collapsing inner
+        # runs would also merge string literals such as 'A  B' and 'A B'
+        cache_key = hashlib.blake2b(sql.strip().encode(), digest_size=16).digest()
+        # A single get(): an entry may expire between a membership test and the read
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return [dict(row) for row in cached]
+        
         try:
             # Run database operation in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                self.executor, 
-                self._execute_query_sync, 
-                sql
-            )
-            return results
+            results, is_read = await asyncio.to_thread(self._execute_query_sync, sql)
         except Exception as e:
             raise Exception(f"Database error: {str(e)}")
+        
+        if is_read:
+            self._query_cache[cache_key] = [dict(row) for row in results]
+        else:
+            # Any write may change what cached reads and samples would return
+            self._query_cache.clear()
+            self._sample_cache = None
+        return results
     
-    def _execute_query_sync(self, sql: str) -> List[Dict[str, Any]]:
-        """Synchronous database query execution"""
+    def _execute_query_sync(self, sql: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """Synchronous database query execution, returning (rows, whether the statement was a read)"""
         if self.use_sqlite:
-            return self._execute_sqlite_query(sql)
+            return self._run_sqlite_query(sql)
         else:
-            return self._execute_mysql_query(sql)
+            return self._run_mysql_query(sql)
     
     def _execute_sqlite_query(self, sql: str) -> List[Dict[str, Any]]:
-        """Execute SQLite query"""
-        conn = None
+        """Execute SQLite query on the thread's cached connection"""
+        return self._run_sqlite_query(sql)[0]
+    
+    def _run_sqlite_query(self, sql: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """Execute SQLite query, returning (rows, whether it was a read that changed nothing)"""
+        conn = getattr(self._tls, 'conn', None) or self._open_sqlite()
         try:
-            conn = sqlite3.connect(self.database)
-            conn.row_factory = sqlite3.Row  # This makes rows dict-like
-            
             cursor = conn.cursor()
+            changes_before = conn.total_changes
             cursor.execute(sql)
+            # Rows must be stepped through before a RETURNING write has applied its changes
+            results = [dict(row) for row in cursor.fetchall()] if cursor.description is not None else None
             
-            # Handle different types of queries
-            if sql.strip().upper().startswith(('SELECT', 'PRAGMA')):
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
-            else:
-                # For INSERT, UPDATE, DELETE
+            # sqlite3 opens a transaction before any statement that can write, so an open
+            # transaction or a change count that moved marks a write, even one that returned rows
+            changes = conn.total_changes - changes_before
+            is_read = not conn.in_transaction and changes == 0
+            if conn.in_transaction:
                 conn.commit()
-                return [{"affected_rows": cursor.rowcount, "message": "Query executed successfully"}]
+            
+            if results is not None:
+                return results, is_read
+            # sqlite3 reports rowcount -1 for writes that start with WITH
+            affected_rows = cursor.rowcount if cursor.rowcount >= 0 else changes
+            return [{"affected_rows": affected_rows, "message": "Query executed successfully"}], is_read
                 
         except Exception as e:
-            if conn:
-                conn.rollback()
+            conn.rollback()
             raise e
-        finally:
-            if conn:
-                conn.close()
     
     def _execute_mysql_query(self, sql: str, params=None) -> List[Dict[str, Any]]:
         """Execute MySQL query"""
-        connection = None
-        try:
-            connection = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
-            
-            with connection.cursor() as cursor:
-                if params:
-                    cursor.execute(sql, params)
-                else:
-                    cursor.execute(sql)
-                
-                # Handle different types of queries
-                if sql.strip().upper().startswith(('SELECT', 'SHOW', 'DESCRIBE')):
-                    results = cursor.fetchall()
-                    return results
-                else:
-                    # For INSERT, UPDATE, DELETE
-                    connection.commit()
-                    return [{"affected_rows": cursor.rowcount, "message": "Query executed successfully"}]
+        return self._run_mysql_query(sql, params)[0]
+    
+    def _run_mysql_query(self, sql: str, params=None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Execute MySQL query, returning (rows, whether it was a read that changed nothing)"""
+        with self.get_connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    if params:
+                        cursor.execute(sql, params)
+                    else:
+                        cursor.execute(sql)
                     
-        except Exception as e:
-            if connection:
+                    # WITH ... SELECT returns rows and WITH ... DELETE does not, so a read needs both
+                    # a result set and a read-only leading keyword
+                    match = _FIRST_KEYWORD_RE.match(sql)
+                    is_read = (cursor.description is not None and match is not None and
+                               match.group(1).upper() in _MYSQL_READS)
+                    results = cursor.fetchall() if cursor.description is not None else None
+                    if not is_read:
+                        connection.commit()
+                    
+                    if results is not None:
+                        return results, is_read
+                    return [{"affected_rows": cursor.rowcount, "message": "Query executed successfully"}], is_read
+                        
+            except Exception as e:
                 connection.rollback()
-            raise e
-        finally:
-            if connection:
-                connection.close()
+                raise e
+    
+    def _execute_mysql_many(self, queries: List[str]) -> List[Any]:
+        """Run several read queries on one pooled connection; a failing query yields its exception"""
+        results = []
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                for query in queries:
+                    try:
+                        cursor.execute(query)
+                        results.append(cursor.fetchall())
+                    except Exception as e:
+                        results.append(e)
+        return results
     
     async def get_schema_info(self) -> Dict[str, Any]:
-        """Get database schema information for context"""
+        """Get database schema information for context, cached for SCHEMA_CACHE_TTL seconds"""
+        self.schema_version()
+        cached = self._schema_cache
+        if cached and time.monotonic() - cached[0] < self._schema_ttl:
+            return cached[1]
+        
+        # Concurrent misses wait for a single introspection instead of each running one
+        async with self._schema_lock:
+            cached = self._schema_cache
+            if cached and time.monotonic() - cached[0] < self._schema_ttl:
+                return cached[1]
+            
+            try:
+                schema = self._load_cached_schema()
+                if schema is None:
+                    if self.use_sqlite:
+                        schema = await self._get_sqlite_schema_info()
+                    else:
+                        schema = await self._get_mysql_schema_info()
+                    schema = _intern_schema(schema)
+                    self._schema_cache = (time.monotonic(), schema)
+                    self._save_cached_schema(schema)
+                return schema
+            except Exception as e:
+                raise Exception(f"Failed to get schema info: {str(e)}")
+    
+    def invalidate_schema(self):
+        """Drop the cached schema, samples and query results in every worker (call after DDL)"""
+        self._drop_caches()
         try:
-            if self.use_sqlite:
-                return await self._get_sqlite_schema_info()
-            else:
-                return await self._get_mysql_schema_info()
-        except Exception as e:
-            raise Exception(f"Failed to get schema info: {str(e)}")
+            os.remove(self._schema_cache_path)
+        except OSError:
+            pass
+        
+        # Sibling workers see the new mtime on their next schema_version() call
+        try:
+            os.makedirs(os.path.dirname(self._invalidation_path), exist_ok=True)
+            with open(self._invalidation_path, 'w') as f:
+                f.write(str(time.time_ns()))
+        except OSError:
+            pass
+        self._invalidation_stamp = self._read_invalidation_stamp()
+    
+    def schema_version(self) -> int:
+        """Return the latest invalidation stamp, first dropping local caches if another worker bumped it"""
+        stamp = self._read_invalidation_stamp()
+        if stamp != self._invalidation_stamp:
+            self._invalidation_stamp = stamp
+            self._drop_caches()
+        return stamp
+    
+    def _read_invalidation_stamp(self) -> int:
+        """Modification time of the shared invalidation file, or 0 if it was never written"""
+        try:
+            return os.stat(self._invalidation_path).st_mtime_ns
+        except OSError:
+            return 0
+    
+    def _drop_caches(self):
+        """Forget everything cached in this process"""
+        self._schema_cache = None
+        self._sample_cache = None
+        self._query_cache.clear()
+    
+    @property
+    def dialect(self) -> str:
+        """SQL dialect of the configured database"""
+        return "sqlite" if self.use_sqlite else "mysql"
+    
+    def identity(self) -> str:
+        """Identify the database that on-disk caches built from it belong to"""
+        if self.use_sqlite:
+            return f"sqlite:{os.path.abspath(self.database)}"
+        return f"mysql:{self.user}@{self.host}:{self.port}/{self.database}"
+    
+    def _load_cached_schema(self):
+        """Load a still-fresh schema from disk to avoid cold-start introspection"""
+        try:
+            with open(self._schema_cache_path, 'rb') as f:
+                key, saved_at, schema = pickle.load(f)
+        except Exception:
+            return None
+        
+        age = time.time() - saved_at
+        if key != self.identity() or not 0 <= age < self._schema_ttl:
+            return None
+        
+        # Unpickled strings are fresh copies, so intern them again
+        schema = _intern_schema(schema)
+        self._schema_cache = (time.monotonic() - age, schema)
+        return schema
+    
+    def _save_cached_schema(self, schema: Dict[str, Any]):
+        """Persist the schema for the next process; failures are non-fatal"""
+        try:
+            os.makedirs(os.path.dirname(self._schema_cache_path), exist_ok=True)
+            with open(self._schema_cache_path, 'wb') as f:
+                pickle.dump((self.identity(), time.time(), schema), f)
+        except Exception:
+            pass
     
     async def _get_sqlite_schema_info(self) -> Dict[str, Any]:
         """Get schema information from SQLite database"""
         try:
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                self.executor,
+            # Pull every table's columns in one round trip via the pragma table-valued function
+            results = await asyncio.to_thread(
                 self._execute_sqlite_query,
-                "SELECT name FROM sqlite_master WHERE type='table'"
+                """
+                SELECT m.name AS table_name, p.name, p.type, p."notnull", p.pk
+                FROM sqlite_master m
+                JOIN pragma_table_info(m.name) p
+                WHERE m.type = 'table'
+                ORDER BY m.rowid, p.cid
+                """
             )
             
             schema = {}
-            for table_row in results:
-                table_name = table_row['name']
-                
-                # Get table info
-                table_info = await loop.run_in_executor(
-                    self.executor,
-                    self._execute_sqlite_query,
-                    f"PRAGMA table_info({table_name})"
-                )
-                
-                schema[table_name] = []
-                for col in table_info:
-                    schema[table_name].append({
-                        'column': col['name'],
-                        'type': col['type'],
-                        'nullable': 'YES' if col['notnull'] == 0 else 'NO',
-                        'key': 'PRI' if col['pk'] == 1 else ''
-                    })
+            for col in results:
+                schema.setdefault(col['table_name'], []).append({
+                    'column': col['name'],
+                    'type': col['type'],
+                    'nullable': 'YES' if col['notnull'] == 0 else 'NO',
+                    'key': 'PRI' if col['pk'] == 1 else ''
+                })
             
             return schema
             
@@ -160,9 +373,7 @@ class DatabaseManager:
             ORDER BY TABLE_NAME, ORDINAL_POSITION
             """
             
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                self.executor,
+            results = await asyncio.to_thread(
                 self._execute_mysql_query,
                 schema_query,
                 (self.database,)
@@ -197,91 +408,85 @@ class DatabaseManager:
                 return False
         else:
             try:
-                connection = pymysql.connect(
-                    host=self.host,
-                    port=self.port,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database,
-                    charset='utf8mb4'
-                )
-                connection.close()
+                with self.get_connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
                 return True
             except Exception:
                 return False
 
     async def get_sample_data(self) -> Dict[str, Any]:
-        """Get sample data from all tables"""
-        try:
-            if self.use_sqlite:
-                return await self._get_sqlite_sample_data()
-            else:
-                return await self._get_mysql_sample_data()
-        except Exception as e:
-            raise Exception(f"Failed to get sample data: {str(e)}")
-    
-    async def _get_sqlite_sample_data(self) -> Dict[str, Any]:
-        """Get enhanced sample data from SQLite database with context"""
-        tables = ['Account', 'Contact', 'Opportunity', 'Session', 'ProgramInstructorAvailability']
-        sample_data = {}
+        """Get sample data from all tables, cached like the schema until the next write"""
+        self.schema_version()
+        cached = self._sample_cache
+        if cached and time.monotonic() - cached[0] < self._schema_ttl:
+            return cached[1]
         
-        for table in tables:
+        async with self._sample_lock:
+            cached = self._sample_cache
+            if cached and time.monotonic() - cached[0] < self._schema_ttl:
+                return cached[1]
+            
             try:
-                loop = asyncio.get_event_loop()
-                
-                # Get sample data with more context-relevant queries
-                if table == 'Contact':
-                    # Show variety of contact types/roles
-                    query = f"SELECT * FROM {table} ORDER BY Title LIMIT 5"
-                elif table == 'Session':
-                    # Show different session types and statuses
-                    query = f"SELECT * FROM {table} ORDER BY Status, Name LIMIT 5"
-                elif table == 'Opportunity':
-                    # Show different opportunity stages
-                    query = f"SELECT * FROM {table} ORDER BY StageName LIMIT 5"
+                if self.use_sqlite:
+                    sample_data, complete = await self._get_sqlite_sample_data()
                 else:
-                    query = f"SELECT * FROM {table} LIMIT 5"
-                
-                results = await loop.run_in_executor(
-                    self.executor,
-                    self._execute_sqlite_query,
-                    query
-                )
-                sample_data[table] = results
-            except Exception:
-                sample_data[table] = []
-        
-        return sample_data
+                    sample_data, complete = await self._get_mysql_sample_data()
+            except Exception as e:
+                raise Exception(f"Failed to get sample data: {str(e)}")
+            
+            # A table that failed to load is retried on the next call rather than cached as empty
+            if complete:
+                self._sample_cache = (time.monotonic(), sample_data)
+            return sample_data
     
-    async def _get_mysql_sample_data(self) -> Dict[str, Any]:
-        """Get enhanced sample data from MySQL database with context"""
+    def _get_sample_queries(self) -> Dict[str, str]:
+        """Build the per-table sample data queries"""
         tables = ['Account', 'Contact', 'Opportunity', 'Session', 'ProgramInstructorAvailability']
-        sample_data = {}
+        queries = {}
         
         for table in tables:
-            try:
-                loop = asyncio.get_event_loop()
-                
-                # Get sample data with more context-relevant queries
-                if table == 'Contact':
-                    # Show variety of contact types/roles
-                    query = f"SELECT * FROM {table} ORDER BY Title LIMIT 5"
-                elif table == 'Session':
-                    # Show different session types and statuses
-                    query = f"SELECT * FROM {table} ORDER BY Status, Name LIMIT 5"
-                elif table == 'Opportunity':
-                    # Show different opportunity stages
-                    query = f"SELECT * FROM {table} ORDER BY StageName LIMIT 5"
-                else:
-                    query = f"SELECT * FROM {table} LIMIT 5"
-                
-                results = await loop.run_in_executor(
-                    self.executor,
-                    self._execute_mysql_query,
-                    query
-                )
-                sample_data[table] = results
-            except Exception:
-                sample_data[table] = []
+            # Get sample data with more context-relevant queries
+            if table == 'Contact':
+                # Show variety of contact types/roles
+                queries[table] = f"SELECT * FROM {table} ORDER BY Title LIMIT 5"
+            elif table == 'Session':
+                # Show different session types and statuses
+                queries[table] = f"SELECT * FROM {table} ORDER BY Status, Name LIMIT 5"
+            elif table == 'Opportunity':
+                # Show different opportunity stages
+                queries[table] = f"SELECT * FROM {table} ORDER BY StageName LIMIT 5"
+            else:
+                queries[table] = f"SELECT * FROM {table} LIMIT 5"
+        
+        return queries
+    
+    async def _get_sqlite_sample_data(self) -> Tuple[Dict[str, Any], bool]:
+        """Get enhanced sample data from SQLite, and whether every table loaded"""
+        queries = self._get_sample_queries()
+        
+        # Run the per-table queries concurrently across the default thread pool
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._execute_sqlite_query, query)
+              for query in queries.values()),
+            return_exceptions=True
+        )
         
-        return sample_data
+        return self._collect_samples(queries, results)
+    
+    async def _get_mysql_sample_data(self) -> Tuple[Dict[str, Any], bool]:
+        """Get enhanced sample data from MySQL, and whether every table loaded"""
+        queries = self._get_sample_queries()
+        
+        # Run all per-table queries on a single pooled connection; failing to connect raises
+        results = await asyncio.to_thread(self._execute_mysql_many, list(queries.values()))
+        return self._collect_samples(queries, results)
+    
+    @staticmethod
+    def _collect_samples(queries: Dict[str, str], results: List[Any]) -> Tuple[Dict[str, Any], bool]:
+        """Pair per-table results with their tables, leaving failed tables empty"""
+        sample_data = {
+            table: [] if isinstance(result, Exception) else result
+            for table, result in zip(queries, results)
+        }
+        return sample_data, not any(isinstance(result, Exception) for result in results)
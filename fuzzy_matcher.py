@@ -6,14 +6,93 @@ helping to handle typos, case differences, and similar variations in column name
 """
 
 from typing import Dict, List, Tuple, Any, Optional
+import heapq
 from rapidfuzz import fuzz, process
+import numpy as np
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from cachetools import LRUCache
 
 
-@dataclass
+# Common SQL error patterns for unknown columns, fused into one alternation
+_COLUMN_ERROR_RE = re.compile(
+    r"Unknown column '([^']+)'"
+    r"|Column '([^']+)' doesn't exist"
+    r"|Invalid column name '([^']+)'"
+    r"|column \"([^\"]+)\" does not exist"
+    r"|no such column: ([^\s]+)",
+    re.IGNORECASE
+)
+
+# Clauses that reference columns in a SQL query. Wrapped in a lookahead so that,
+# like scanning with each pattern separately, matches of different clauses may overlap.
+_SQL_COLUMN_REF_RE = re.compile(
+    r'(?=SELECT\s+(.+?)\s+FROM'
+    r'|WHERE\s+([^=<>!]+?)(?:\s*[=<>!]|\s+LIKE|\s+IN)'
+    r'|ORDER\s+BY\s+([^,\s]+)'
+    r'|GROUP\s+BY\s+([^,\s]+)'
+    r'|JOIN\s+\w+\s+ON\s+([^=\s]+))',
+    re.IGNORECASE | re.DOTALL
+)
+
+# SQL keywords and aggregate functions that are never column references
+_SQL_KEYWORDS = frozenset({
+    'select', 'from', 'where', 'join', 'inner', 'left', 'right', 'outer', 
+    'on', 'and', 'or', 'not', 'in', 'like', 'between', 'is', 'null',
+    'count', 'sum', 'avg', 'max', 'min', 'distinct', 'as', 'order', 'by',
+    'group', 'having', 'limit', 'offset', 'union', 'all', 'case', 'when',
+    'then', 'else', 'end', 'if', 'exists', 'any', 'some', '*'
+})
+
+# Translation tables used to derive searchable column-name variants
+_DROP_UNDERSCORES = str.maketrans('', '', '_')
+_UNDERSCORES_TO_SPACES = str.maketrans('_', ' ')
+
+# Business context terms for tables, used to improve matching
+_TABLE_CONTEXTS = {
+    'Account': 'organization company school client customer',
+    'Contact': 'person individual user staff instructor teacher',
+    'Opportunity': 'deal project program engagement grant donation',
+    'Session': 'class workshop program course meeting',
+    'ProgramInstructorAvailability': 'instructor teacher staff availability schedule',
+    'Student': 'pupil learner participant child',
+    'Campaign': 'marketing outreach communication email',
+    'Lead': 'prospect potential customer inquiry',
+}
+
+_SORT_DIRECTION_RE = re.compile(r'\s*(ASC|DESC)\s*$', re.IGNORECASE)
+# Numeric literals, quoted string literals, or anything containing a function call
+_NON_COLUMN_RE = re.compile(r"""
+    [\d.\-+]+$
+  | (['"]) (?:.*\1)? \Z
+  | .*[()]
+""", re.VERBOSE | re.DOTALL)
+
+
+def _strip_custom_suffix(name: str) -> str:
+    """Drop the Salesforce custom-field suffix, which would otherwise leave a stray 'c' word."""
+    return name[:-3] if name.endswith('__c') else name
+
+
+def _trigrams(text: str) -> set:
+    """Return the set of 3-character substrings of a string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _top_indices(scores: np.ndarray, limit: int, min_score: float = 0) -> np.ndarray:
+    """Return the indices of the `limit` highest scores >= min_score, best first (ties by index)."""
+    candidates = np.flatnonzero(scores >= min_score) if min_score else np.arange(len(scores))
+    if limit < len(candidates):
+        # Partition to find the cutoff score, then keep everything at or above it
+        kept = scores[candidates]
+        cutoff = kept[np.argpartition(-kept, limit - 1)[limit - 1]]
+        candidates = candidates[kept >= cutoff]
+    return candidates[np.argsort(-scores[candidates], kind='stable')][:limit]
+
+
+@dataclass(frozen=True)
 class ColumnMatch:
-    """Represents a fuzzy match result for a column name"""
+    """Represents a fuzzy match result for a column name; immutable because cached results are shared"""
     original_term: str
     matched_column: str
     table_name: str
@@ -22,6 +101,22 @@ class ColumnMatch:
     suggestion: str = None
 
 
+@dataclass
+class _ColumnIndex:
+    """Flattened schema columns stored as parallel lists, built once per schema"""
+    columns: List[str]
+    tables: List[str]
+    columns_lower: List[str]
+    searchable_texts: List[str]
+    trigram_index: Dict[str, List[int]]  # trigram -> positions of columns containing it
+    alias_hits: Dict[str, List[int]]  # canonical alias term -> positions of columns containing it
+    valid_names: frozenset = frozenset()  # lowercase column names, bare and table-qualified
+    positions_by_name: Dict[str, List[int]] = field(default_factory=dict)  # lowercase name -> positions
+    column_parts: List[Tuple[str, ...]] = field(default_factory=list)  # words of each column name
+    # Match, validation and error-correction results for this schema, keyed by (kind, input, ...)
+    results: LRUCache = field(default_factory=lambda: LRUCache(maxsize=4096))
+
+
 class FuzzyColumnMatcher:
     """
     Handles fuzzy matching of column names with support for:
@@ -34,6 +129,7 @@ class FuzzyColumnMatcher:
     def __init__(self):
         self.similarity_threshold = 70  # Minimum similarity score (0-100)
         self.exact_threshold = 90  # Score above which we consider it an exact match
+        self.prefilter_min_columns = 500  # Schema size above which fuzzy scoring is trigram-prefiltered
         
         # Common column aliases and business terms
         self.column_aliases = {
@@ -85,6 +181,77 @@ class FuzzyColumnMatcher:
             (r'mm', 'm'),  # comment -> coment
             (r'nn', 'n'),  # connection -> conection
         ]
+        
+        # Flattened column data for the most recently seen schema: (schema dict, schema key, _ColumnIndex)
+        self._column_cache = None
+    
+    def _get_column_index(self, schema_info: Dict[str, Any]) -> _ColumnIndex:
+        """Return the flattened column data for a schema, rebuilding it only when the schema changes."""
+        cached = self._column_cache
+        # The database layer hands back the same cached schema dict until it expires,
+        # so an identity check usually avoids hashing every column name
+        if cached is not None and cached[0] is schema_info:
+            return cached[2]
+        
+        schema_key = hash(tuple(
+            (table_name, tuple(col_info['column'] for col_info in columns))
+            for table_name, columns in schema_info.items()
+        ))
+        if cached is not None and cached[1] == schema_key:
+            self._column_cache = (schema_info, schema_key, cached[2])
+            return cached[2]
+        
+        index = _ColumnIndex(columns=[], tables=[], columns_lower=[], searchable_texts=[],
+                             trigram_index={}, alias_hits={})
+        for table_name, columns in schema_info.items():
+            for col_info in columns:
+                column_name = col_info['column']
+                position = len(index.columns)
+                index.columns.append(column_name)
+                index.tables.append(table_name)
+                index.columns_lower.append(column_name.lower())
+                index.positions_by_name.setdefault(column_name.lower(), []).append(position)
+                base_name = _strip_custom_suffix(column_name.lower())
+                index.column_parts.append(tuple(base_name.translate(_UNDERSCORES_TO_SPACES).split()))
+                index.searchable_texts.append(self._create_searchable_text(column_name, table_name))
+                for trigram in _trigrams(column_name.lower()):
+                    index.trigram_index.setdefault(trigram, []).append(position)
+        
+        index.valid_names = frozenset(index.columns_lower).union(
+            f"{table_name.lower()}.{column_lower}"
+            for table_name, column_lower in zip(index.tables, index.columns_lower)
+        )
+        
+        # Resolve which columns each canonical alias term occurs in, so alias
+        # lookups at query time are a single dict fetch
+        for canonical_term in set(self.alias_to_column.values()):
+            index.alias_hits[canonical_term] = [
+                i for i, column_lower in enumerate(index.columns_lower)
+                if canonical_term in column_lower
+            ]
+        
+        self._column_cache = (schema_info, schema_key, index)
+        return index
+    
+    def _prefilter_candidates(self, search_term_lower: str, index: _ColumnIndex,
+                              min_candidates: int) -> Optional[np.ndarray]:
+        """
+        Shortlist the columns sharing at least one trigram with the search term.
+        
+        Only applied to large schemas, since transposition typos can share few
+        trigrams with the intended column. Returns None when every column should
+        be scored, including when the shortlist is too small to fill the results.
+        """
+        if len(index.columns) < self.prefilter_min_columns or len(search_term_lower) < 3:
+            return None
+        
+        candidates = set()
+        for trigram in _trigrams(search_term_lower):
+            candidates.update(index.trigram_index.get(trigram, ()))
+        
+        if len(candidates) < min_candidates:
+            return None
+        return np.fromiter(sorted(candidates), dtype=np.intp, count=len(candidates))
     
     def find_column_matches(self, search_term: str, schema_info: Dict[str, Any], 
                           top_n: int = 5) -> List[ColumnMatch]:
@@ -99,106 +266,125 @@ class FuzzyColumnMatcher:
         Returns:
             List of ColumnMatch objects sorted by similarity score
         """
+        # Question and SQL tokens recur across requests, so reuse results for this schema
+        index = self._get_column_index(schema_info)
+        cache_key = ('matches', search_term, top_n)
+        cached = index.results.get(cache_key)
+        if cached is None:
+            cached = tuple(self._match_column(search_term, index, top_n))
+            index.results[cache_key] = cached
+        return list(cached)
+    
+    def _match_column(self, search_term: str, index: _ColumnIndex, top_n: int,
+                      name_scores: Optional[np.ndarray] = None) -> List[ColumnMatch]:
+        """
+        Run the matching phases for one search term against a column index.
+        
+        `name_scores` optionally supplies precomputed WRatio scores of the term
+        against every column name, letting callers score many terms in one batch.
+        """
         matches = []
+        seen = set()  # Column positions already matched
         search_term_lower = search_term.lower().strip()
         
-        # Build a flat list of all columns with their table context
-        all_columns = []
-        for table_name, columns in schema_info.items():
-            for col_info in columns:
-                column_name = col_info['column']
-                all_columns.append({
-                    'column': column_name,
-                    'table': table_name,
-                    'column_lower': column_name.lower(),
-                    'searchable_text': self._create_searchable_text(column_name, table_name)
-                })
-        
         # 1. Exact matches (case insensitive)
-        for col in all_columns:
-            if col['column_lower'] == search_term_lower:
-                matches.append(ColumnMatch(
-                    original_term=search_term,
-                    matched_column=col['column'],
-                    table_name=col['table'],
-                    similarity_score=100.0,
-                    match_type='exact'
-                ))
+        for i in index.positions_by_name.get(search_term_lower, ()):
+            matches.append(ColumnMatch(
+                original_term=search_term,
+                matched_column=index.columns[i],
+                table_name=index.tables[i],
+                similarity_score=100.0,
+                match_type='exact'
+            ))
+            seen.add(i)
         
         # 2. Alias matches
         if search_term_lower in self.alias_to_column:
             canonical_term = self.alias_to_column[search_term_lower]
-            for col in all_columns:
-                if canonical_term in col['column_lower']:
-                    matches.append(ColumnMatch(
-                        original_term=search_term,
-                        matched_column=col['column'],
-                        table_name=col['table'],
-                        similarity_score=95.0,
-                        match_type='alias',
-                        suggestion=f"'{search_term}' matched as alias for '{col['column']}'"
-                    ))
+            for i in index.alias_hits[canonical_term]:
+                matches.append(ColumnMatch(
+                    original_term=search_term,
+                    matched_column=index.columns[i],
+                    table_name=index.tables[i],
+                    similarity_score=95.0,
+                    match_type='alias',
+                    suggestion=f"'{search_term}' matched as alias for '{index.columns[i]}'"
+                ))
+                seen.add(i)
         
         # 3. Fuzzy matching using rapidfuzz
-        if len(matches) < top_n:  # Only do fuzzy matching if we need more results
-            # Try fuzzy matching against column names directly first
-            column_names = [col['column_lower'] for col in all_columns]
-            fuzzy_results = process.extract(
-                search_term_lower, 
-                column_names, 
-                scorer=fuzz.WRatio,  # Weighted ratio for better results
-                limit=top_n * 3  # Get more candidates to filter
-            )
+        if len(matches) < top_n and index.columns:  # Only do fuzzy matching if we need more results
+            # Try fuzzy matching against column names directly first, scoring
+            # every (shortlisted) column in one vectorized call
+            if name_scores is not None:
+                candidates, scores = None, name_scores
+            else:
+                candidates = self._prefilter_candidates(search_term_lower, index, top_n * 3)
+                column_names = index.columns_lower if candidates is None else [
+                    index.columns_lower[i] for i in candidates
+                ]
+                scores = process.cdist(
+                    [search_term_lower],
+                    column_names,
+                    scorer=fuzz.WRatio,  # Weighted ratio for better results
+                    score_cutoff=self.similarity_threshold
+                )[0]
             
-            for match_text, score, idx in fuzzy_results:
-                if score >= self.similarity_threshold:
-                    col = all_columns[idx]
-                    # Avoid duplicates from exact/alias matches
-                    if not any(m.matched_column == col['column'] and m.table_name == col['table'] 
-                              for m in matches):
-                        match_type = 'exact' if score >= self.exact_threshold else 'fuzzy'
-                        matches.append(ColumnMatch(
-                            original_term=search_term,
-                            matched_column=col['column'],
-                            table_name=col['table'],
-                            similarity_score=float(score),
-                            match_type=match_type,
-                            suggestion=f"Did you mean '{col['column']}'?" if match_type == 'fuzzy' else None
-                        ))
+            strong = sum(1 for m in matches if m.similarity_score >= self.exact_threshold)
+            # Get more candidates to filter; only those above the threshold are ranked
+            for pos in _top_indices(scores, top_n * 3, self.similarity_threshold):
+                score = scores[pos]
+                # Candidates arrive best-first: stop once top_n strong matches exist
+                # that weaker ones cannot displace
+                if strong >= top_n and score < self.exact_threshold:
+                    break
+                idx = pos if candidates is None else candidates[pos]
+                column, table = index.columns[idx], index.tables[idx]
+                # Avoid duplicates from exact/alias matches
+                if idx not in seen:
+                    seen.add(idx)
+                    match_type = 'exact' if score >= self.exact_threshold else 'fuzzy'
+                    strong += match_type == 'exact'
+                    matches.append(ColumnMatch(
+                        original_term=search_term,
+                        matched_column=column,
+                        table_name=table,
+                        similarity_score=float(score),
+                        match_type=match_type,
+                        suggestion=f"Did you mean '{column}'?" if match_type == 'fuzzy' else None
+                    ))
             
             # Also try fuzzy matching against searchable text for more complex matches
             if len(matches) < top_n:
-                searchable_texts = [col['searchable_text'] for col in all_columns]
-                fuzzy_results2 = process.extract(
-                    search_term_lower, 
-                    searchable_texts, 
+                min_score = max(60, self.similarity_threshold - 10)  # Lower threshold for searchable text
+                scores = process.cdist(
+                    [search_term_lower],
+                    index.searchable_texts,
                     scorer=fuzz.partial_ratio,  # Partial ratio for searchable text
-                    limit=top_n * 2
-                )
+                    score_cutoff=min_score
+                )[0]
                 
-                for match_text, score, idx in fuzzy_results2:
-                    if score >= max(60, self.similarity_threshold - 10):  # Lower threshold for searchable text
-                        col = all_columns[idx]
-                        # Avoid duplicates
-                        if not any(m.matched_column == col['column'] and m.table_name == col['table'] 
-                                  for m in matches):
-                            matches.append(ColumnMatch(
-                                original_term=search_term,
-                                matched_column=col['column'],
-                                table_name=col['table'],
-                                similarity_score=float(score),
-                                match_type='fuzzy',
-                                suggestion=f"Did you mean '{col['column']}'? (context match)"
-                            ))
+                for idx in _top_indices(scores, top_n * 2, min_score):
+                    # Avoid duplicates
+                    if idx not in seen:
+                        seen.add(idx)
+                        column = index.columns[idx]
+                        matches.append(ColumnMatch(
+                            original_term=search_term,
+                            matched_column=column,
+                            table_name=index.tables[idx],
+                            similarity_score=float(scores[idx]),
+                            match_type='fuzzy',
+                            suggestion=f"Did you mean '{column}'? (context match)"
+                        ))
         
         # 4. Pattern-based matching (Salesforce custom fields, etc.)
         if len(matches) < top_n:
-            pattern_matches = self._find_pattern_matches(search_term, all_columns)
+            pattern_matches = self._find_pattern_matches(search_term, index, seen)
             matches.extend(pattern_matches)
         
-        # Sort by similarity score (descending) and return top N
-        matches.sort(key=lambda x: x.similarity_score, reverse=True)
-        return matches[:top_n]
+        # Return the top N by similarity score (descending, stable for ties)
+        return heapq.nlargest(top_n, matches, key=lambda x: x.similarity_score)
     
     def suggest_column_corrections(self, error_message: str, schema_info: Dict[str, Any]) -> List[str]:
         """
@@ -213,33 +399,51 @@ class FuzzyColumnMatcher:
         """
         suggestions = []
         
-        # Common SQL error patterns for unknown columns
-        column_patterns = [
-            r"Unknown column '([^']+)'",
-            r"Column '([^']+)' doesn't exist",
-            r"Invalid column name '([^']+)'",
-            r"column \"([^\"]+)\" does not exist",
-            r"no such column: ([^\s]+)",
+        # Collect every unknown column first so they can be scored in one batch
+        column_names = [
+            error_match.group(error_match.lastindex)
+            for error_match in _COLUMN_ERROR_RE.finditer(error_message)
         ]
+        if not column_names:
+            return suggestions
+        
+        # The same error against the same schema always yields the same suggestions
+        index = self._get_column_index(schema_info)
+        cache_key = ('corrections', error_message)
+        cached = index.results.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
+        # Clean up the column names (remove table prefixes if present)
+        clean_columns = [column_name.split('.')[-1] for column_name in column_names]
+        
+        score_matrix = None
+        if index.columns:
+            score_matrix = process.cdist(
+                [clean_column.lower().strip() for clean_column in clean_columns],
+                index.columns_lower,
+                scorer=fuzz.WRatio,
+                score_cutoff=self.similarity_threshold,
+                workers=-1
+            )
         
-        for pattern in column_patterns:
-            matches = re.findall(pattern, error_message, re.IGNORECASE)
-            for column_name in matches:
-                # Clean up the column name (remove table prefixes if present)
-                clean_column = column_name.split('.')[-1]
-                
-                # Find fuzzy matches
-                column_matches = self.find_column_matches(clean_column, schema_info, top_n=3)
-                
-                if column_matches:
-                    suggestions.append(f"Column '{column_name}' not found. Did you mean:")
-                    for match in column_matches[:3]:  # Top 3 suggestions
-                        suggestions.append(
-                            f"  • {match.table_name}.{match.matched_column} "
-                            f"(similarity: {match.similarity_score:.1f}%)"
-                        )
-                    suggestions.append("")  # Empty line for readability
-        
+        for row, (column_name, clean_column) in enumerate(zip(column_names, clean_columns)):
+            # Find fuzzy matches
+            column_matches = self._match_column(
+                clean_column, index, top_n=3,
+                name_scores=score_matrix[row] if score_matrix is not None else None
+            )
+            
+            if column_matches:
+                suggestions.append(f"Column '{column_name}' not found. Did you mean:")
+                for match in column_matches[:3]:  # Top 3 suggestions
+                    suggestions.append(
+                        f"  • {match.table_name}.{match.matched_column} "
+                        f"(similarity: {match.similarity_score:.1f}%)"
+                    )
+                suggestions.append("")  # Empty line for readability
+        
+        index.results[cache_key] = tuple(suggestions)
         return suggestions
     
     def _create_searchable_text(self, column_name: str, table_name: str) -> str:
@@ -255,40 +459,34 @@ class FuzzyColumnMatcher:
         """
         # Start with the original column name
         searchable = column_name.lower()
+        parts = [searchable]
+        # Variants are built from the name without its custom-field suffix, split like column_parts
+        base_name = _strip_custom_suffix(searchable)
         
-        # Add variations without underscores and __c suffixes
-        clean_name = column_name.replace('_', '').replace('__c', '').lower()
+        # Add variation without underscores
+        clean_name = base_name.translate(_DROP_UNDERSCORES)
         if clean_name != searchable:
-            searchable += ' ' + clean_name
+            parts.append(clean_name)
         
         # Add space-separated version
-        spaced_name = column_name.replace('_', ' ').replace('__c', '').lower()
-        if spaced_name not in searchable:
-            searchable += ' ' + spaced_name
+        spaced_name = ' '.join(base_name.translate(_UNDERSCORES_TO_SPACES).split())
+        if spaced_name not in ' '.join(parts):
+            parts.append(spaced_name)
         
         # Add table context for business meaning
         table_context = self._get_table_context(table_name)
         if table_context:
-            searchable += ' ' + table_context
+            parts.append(table_context)
         
-        return searchable
+        return ' '.join(parts)
     
     def _get_table_context(self, table_name: str) -> str:
         """Get business context terms for a table to improve matching."""
-        table_contexts = {
-            'Account': 'organization company school client customer',
-            'Contact': 'person individual user staff instructor teacher',
-            'Opportunity': 'deal project program engagement grant donation',
-            'Session': 'class workshop program course meeting',
-            'ProgramInstructorAvailability': 'instructor teacher staff availability schedule',
-            'Student': 'pupil learner participant child',
-            'Campaign': 'marketing outreach communication email',
-            'Lead': 'prospect potential customer inquiry',
-        }
-        return table_contexts.get(table_name, '')
+        return _TABLE_CONTEXTS.get(table_name, '')
     
-    def _find_pattern_matches(self, search_term: str, all_columns: List[Dict]) -> List[ColumnMatch]:
-        """Find matches based on common patterns (e.g., Salesforce custom fields)."""
+    def _find_pattern_matches(self, search_term: str, index: _ColumnIndex,
+                              seen: set) -> List[ColumnMatch]:
+        """Find matches based on common patterns (e.g., Salesforce custom fields), skipping positions in `seen`."""
         matches = []
         search_lower = search_term.lower()
         
@@ -296,30 +494,30 @@ class FuzzyColumnMatcher:
         if not search_term.endswith('__c'):
             # Try adding __c suffix
             salesforce_term = search_term + '__c'
-            for col in all_columns:
-                if col['column_lower'] == salesforce_term.lower():
-                    matches.append(ColumnMatch(
-                        original_term=search_term,
-                        matched_column=col['column'],
-                        table_name=col['table'],
-                        similarity_score=90.0,
-                        match_type='pattern',
-                        suggestion=f"Salesforce custom field: '{search_term}' -> '{col['column']}'"
-                    ))
+            for i in index.positions_by_name.get(salesforce_term.lower(), ()):
+                matches.append(ColumnMatch(
+                    original_term=search_term,
+                    matched_column=index.columns[i],
+                    table_name=index.tables[i],
+                    similarity_score=90.0,
+                    match_type='pattern',
+                    suggestion=f"Salesforce custom field: '{search_term}' -> '{index.columns[i]}'"
+                ))
+                seen.add(i)
         
         # Partial word matching for compound field names
-        for col in all_columns:
-            col_parts = col['column_lower'].replace('_', ' ').replace('__c', '').split()
+        for i, col_parts in enumerate(index.column_parts):
             if search_lower in col_parts or any(search_lower in part for part in col_parts):
-                if not any(m.matched_column == col['column'] and m.table_name == col['table'] 
-                          for m in matches):
+                column, table = index.columns[i], index.tables[i]
+                if i not in seen:
+                    seen.add(i)
                     matches.append(ColumnMatch(
                         original_term=search_term,
-                        matched_column=col['column'],
-                        table_name=col['table'],
+                        matched_column=column,
+                        table_name=table,
                         similarity_score=80.0,
                         match_type='pattern',
-                        suggestion=f"Partial match: '{search_term}' found in '{col['column']}'"
+                        suggestion=f"Partial match: '{search_term}' found in '{column}'"
                     ))
         
         return matches
@@ -335,87 +533,85 @@ class FuzzyColumnMatcher:
         Returns:
             Tuple of (is_valid, list_of_suggestions)
         """
+        # Generated SQL often repeats, so reuse the verdict for this schema
+        index = self._get_column_index(schema_info)
+        cache_key = ('validate', sql_query)
+        cached = index.results.get(cache_key)
+        if cached is not None:
+            return cached[0], list(cached[1])
+        
         suggestions = []
         is_valid = True
         
-        # Extract potential column references from SQL
-        # This is a simple regex-based approach - could be enhanced with proper SQL parsing
-        column_patterns = [
-            r'SELECT\s+(.+?)\s+FROM',
-            r'WHERE\s+([^=<>!]+?)(?:\s*[=<>!]|\s+LIKE|\s+IN)',
-            r'ORDER\s+BY\s+([^,\s]+)',
-            r'GROUP\s+BY\s+([^,\s]+)',
-            r'JOIN\s+\w+\s+ON\s+([^=\s]+)',
-        ]
-        
-        # Build a set of all valid column names (with table prefixes)
-        valid_columns = set()
-        for table_name, columns in schema_info.items():
-            for col_info in columns:
-                column_name = col_info['column']
-                valid_columns.add(column_name.lower())
-                valid_columns.add(f"{table_name.lower()}.{column_name.lower()}")
+        # All valid column names (with and without table prefixes), built once per schema
+        valid_columns = index.valid_names
+        unknown_columns = []
         
         # Check for potential column references
-        for pattern in column_patterns:
-            matches = re.findall(pattern, sql_query, re.IGNORECASE | re.DOTALL)
-            for match in matches:
-                # Split by comma and clean up each potential column
-                potential_columns = [col.strip() for col in match.split(',')]
+        # This is a simple regex-based approach - could be enhanced with proper SQL parsing
+        for ref_match in _SQL_COLUMN_REF_RE.finditer(sql_query):
+            # Split by comma and clean up each potential column
+            potential_columns = [col.strip() for col in ref_match.group(ref_match.lastindex).split(',')]
+            
+            for col in potential_columns:
+                # Clean up the column reference
+                clean_col = _SORT_DIRECTION_RE.sub('', col.strip())
+                clean_col = clean_col.strip('`"\'')  # Remove quotes
+                
+                # Skip SQL functions, keywords, and literals
+                if self._is_sql_keyword_or_function(clean_col):
+                    continue
                 
-                for col in potential_columns:
-                    # Clean up the column reference
-                    clean_col = re.sub(r'\s*(ASC|DESC)\s*$', '', col.strip(), flags=re.IGNORECASE)
-                    clean_col = clean_col.strip('`"\'')  # Remove quotes
-                    
-                    # Skip SQL functions, keywords, and literals
-                    if self._is_sql_keyword_or_function(clean_col):
-                        continue
-                    
-                    # Check if column exists
-                    if clean_col.lower() not in valid_columns:
-                        # Try to find fuzzy matches
-                        column_matches = self.find_column_matches(clean_col, schema_info, top_n=3)
-                        if column_matches and column_matches[0].similarity_score < 95:
-                            is_valid = False
-                            suggestions.append(f"Potential issue with column '{clean_col}':")
-                            for match in column_matches[:3]:
-                                suggestions.append(
-                                    f"  • Did you mean {match.table_name}.{match.matched_column}? "
-                                    f"(similarity: {match.similarity_score:.1f}%)"
-                                )
-                            suggestions.append("")
+                # Check if column exists
+                if clean_col.lower() not in valid_columns:
+                    unknown_columns.append(clean_col)
+        
+        # References already known to pass, including near-exact names that never ran full matching
+        distinct_columns = list(dict.fromkeys(unknown_columns))
+        accepted = {col for col in distinct_columns if ('accepted', col) in index.results}
+        
+        # Score every unknown column not matched before against all column names in one batch
+        pending = [col for col in distinct_columns
+                   if col not in accepted and ('matches', col, 3) not in index.results]
+        if pending and index.columns:
+            score_matrix = process.cdist(
+                [col.lower().strip() for col in pending],
+                index.columns_lower,
+                scorer=fuzz.WRatio,
+                score_cutoff=self.similarity_threshold,
+                workers=-1
+            )
+            # A name scoring 95+ always leads the match list, so those references pass
+            # without running the remaining matching phases
+            needs_matching = score_matrix.max(axis=1) < 95
+            for col, flag in zip(pending, needs_matching):
+                if not flag:
+                    accepted.add(col)
+                    index.results[('accepted', col)] = True
+            for row in np.flatnonzero(needs_matching):
+                index.results[('matches', pending[row], 3)] = tuple(
+                    self._match_column(pending[row], index, top_n=3, name_scores=score_matrix[row])
+                )
         
+        for clean_col in unknown_columns:
+            if clean_col in accepted:
+                continue
+            # Try to find fuzzy matches
+            column_matches = self.find_column_matches(clean_col, schema_info, top_n=3)
+            if column_matches and column_matches[0].similarity_score < 95:
+                is_valid = False
+                suggestions.append(f"Potential issue with column '{clean_col}':")
+                for match in column_matches[:3]:
+                    suggestions.append(
+                        f"  • Did you mean {match.table_name}.{match.matched_column}? "
+                        f"(similarity: {match.similarity_score:.1f}%)"
+                    )
+                suggestions.append("")
+        
+        index.results[cache_key] = (is_valid, tuple(suggestions))
         return is_valid, suggestions
     
     def _is_sql_keyword_or_function(self, term: str) -> bool:
         """Check if a term is likely a SQL keyword or function."""
-        sql_keywords = {
-            'select', 'from', 'where', 'join', 'inner', 'left', 'right', 'outer', 
-            'on', 'and', 'or', 'not', 'in', 'like', 'between', 'is', 'null',
-            'count', 'sum', 'avg', 'max', 'min', 'distinct', 'as', 'order', 'by',
-            'group', 'having', 'limit', 'offset', 'union', 'all', 'case', 'when',
-            'then', 'else', 'end', 'if', 'exists', 'any', 'some', '*'
-        }
-        
-        term_lower = term.lower().strip()
-        
-        # Check for SQL keywords
-        if term_lower in sql_keywords:
-            return True
-        
-        # Check for function calls (contains parentheses)
-        if '(' in term or ')' in term:
-            return True
-        
-        # Check for numeric literals
-        if re.match(r'^[\d\.\-\+]+$', term_lower):
-            return True
-        
-        # Check for string literals
-        if term.startswith("'") and term.endswith("'"):
-            return True
-        if term.startswith('"') and term.endswith('"'):
-            return True
-        
-        return False
+        term = term.strip()
+        return term.lower() in _SQL_KEYWORDS or _NON_COLUMN_RE.match(term) is not None
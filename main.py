@@ -1,17 +1,51 @@
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict
 import os
-from dotenv import load_dotenv
+import asyncio
+import hashlib
+import orjson
+from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from config import get_settings
 from database import DatabaseManager
-from sql_generator import SQLGenerator
+from sql_generator import SQLGenerator, PROMPT_VERSION, _STATIC_TRAILER
+from semantic_cache import SemanticCache
 
-# Load environment variables
-load_dotenv()
+settings = get_settings()
 
-app = FastAPI(title="SQL Agent", description="Natural Language to SQL Chat Interface")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Configure the worker pool and warm caches on startup; release connections on shutdown"""
+    # Size the default executor used by asyncio.to_thread for blocking DB calls
+    if settings.thread_pool_size:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=settings.thread_pool_size)
+        )
+    
+    # Load schema and sample data before the first request needs them
+    try:
+        await db_manager.get_schema_info()
+        await db_manager.get_sample_data()
+    except Exception:
+        # The database may not be reachable yet; requests will retry
+        pass
+    
+    yield
+    
+    db_manager.close()
+
+app = FastAPI(
+    title="SQL Agent",
+    description="Natural Language to SQL Chat Interface",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -20,17 +54,133 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 # Initialize components
-db_manager = DatabaseManager()
-sql_generator = SQLGenerator()
+db_manager = DatabaseManager(settings)
+sql_generator = SQLGenerator(settings)
+
+# Generated SQL keyed by normalized question, so repeated questions skip the LLM
+sql_cache = TTLCache(maxsize=1024, ttl=settings.sql_cache_ttl)
+# In-flight generations: normalized question -> [lock, number of requests holding or awaiting it]
+_sql_locks: Dict[str, list] = {}
+
+# Serialized bodies of the read-only endpoints: name -> (source object, JSON bytes, ETag)
+_json_bodies: Dict[str, tuple] = {}
+
+# Optional embedding-based cache that also catches paraphrased questions
+semantic_cache = SemanticCache(
+    database=db_manager.identity(), dialect=db_manager.dialect, prompt_version=PROMPT_VERSION, settings=settings
+) if settings.semantic_cache else None
+
+# Schema invalidation stamp the SQL caches above were filled under; a different stamp means
+# some worker ran /api/schema/invalidate and this worker's generated SQL may be stale
+_cache_version = db_manager.schema_version()
+
+# Static business context served alongside the data dictionary
+BUSINESS_CONTEXT = {
+    "domain": "STEM Education Program Management",
+    "system_type": "Salesforce-based CRM",
+    "primary_entities": [
+        "Schools/Organizations (Account)",
+        "People (Contact)", 
+        "Program Opportunities (Opportunity)",
+        "Classes/Workshops (Session)",
+        "Instructor Scheduling (ProgramInstructorAvailability)"
+    ],
+    "common_use_cases": [
+        "Find available instructors for specific sessions",
+        "Track program enrollment and opportunities",
+        "Manage school partnerships and contacts",
+        "Schedule STEM classes and workshops",
+        "Monitor program success and completion rates"
+    ]
+}
+
+def _normalize_query(query: str) -> str:
+    """Normalize a question for use as a cache key"""
+    return ' '.join(query.lower().split())
+
+async def _no_vector() -> None:
+    """Placeholder embedding step when the semantic cache is disabled"""
+    return None
+
+def _drop_stale_sql():
+    """Clear this worker's generated SQL if the schema was invalidated by any worker"""
+    global _cache_version
+    version = db_manager.schema_version()
+    if version != _cache_version:
+        _cache_version = version
+        sql_cache.clear()
+        if semantic_cache is not None:
+            semantic_cache.reset()
+
+async def generate_sql_cached(query: str) -> str:
+    """Generate SQL for a question, collapsing concurrent identical questions into one LLM call"""
+    _drop_stale_sql()
+    key = _normalize_query(query)
+    # Single get()s: a TTL entry may expire between a membership test and the read
+    cached = sql_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    entry = _sql_locks.get(key)
+    if entry is None:
+        entry = _sql_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            cached = sql_cache.get(key)
+            if cached is not None:
+                return cached
+            
+            # Get database schema information, sample data and the question embedding concurrently
+            schema_info, sample_data, vector = await asyncio.gather(
+                db_manager.get_schema_info(),
+                db_manager.get_sample_data(),
+                semantic_cache.embed(query) if semantic_cache is not None else _no_vector()
+            )
+            
+            if semantic_cache is not None and vector is not None:
+                sql_query, vector = await semantic_cache.lookup(query, schema_info, vector)
+                if sql_query is not None:
+                    sql_cache[key] = sql_query
+                    return sql_query
+            
+            # Generate SQL from natural language with enhanced context
+            sql_query = await sql_generator.generate_sql(query, schema_info, sample_data)
+            sql_cache[key] = sql_query
+            if semantic_cache is not None:
+                await semantic_cache.store(query, schema_info, vector, sql_query)
+            return sql_query
+    finally:
+        # Drop the entry only once no request is queued on it, or a newcomer would
+        # create a second lock and repeat the LLM call
+        entry[1] -= 1
+        if entry[1] == 0:
+            _sql_locks.pop(key, None)
+
+def _cached_json_response(request: Request, name: str, source: Any, build) -> Response:
+    """Serve a JSON body that is re-serialized only when its source object changes, honoring If-None-Match"""
+    cached = _json_bodies.get(name)
+    if cached is None or cached[0] is not source:
+        body = orjson.dumps(jsonable_encoder(build()))
+        cached = (source, body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        _json_bodies[name] = cached
+    
+    headers = {"ETag": cached[2], "Cache-Control": "public, max-age=60"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and cached[2] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached[1], media_type="application/json", headers=headers)
 
 class QueryRequest(BaseModel):
+    model_config = ConfigDict(extra='ignore', str_strip_whitespace=True)
+    
     query: str
 
 class QueryResponse(BaseModel):
     sql: str
-    results: list
-    error: str = None
-    suggestions: list = None
+    results: List[Dict[str, Any]]
+    error: Optional[str] = None
+    suggestions: Optional[List[str]] = None
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -41,24 +191,24 @@ async def home(request: Request):
 async def process_query(request: QueryRequest):
     """Process natural language query and return SQL results"""
     try:
-        # Get database schema information and sample data
-        schema_info = await db_manager.get_schema_info()
-        sample_data = await db_manager.get_sample_data()
-        
-        # Generate SQL from natural language with enhanced context
-        sql_query = await sql_generator.generate_sql(request.query, schema_info, sample_data)
+        # Generate SQL from natural language, reusing it for repeated questions
+        sql_query = await generate_sql_cached(request.query)
         
         try:
             # Execute the query
             results = await db_manager.execute_query(sql_query)
             
-            return QueryResponse(
+            # Fields are built here, so skip re-validating them; the response model still serializes
+            return QueryResponse.model_construct(
                 sql=sql_query,
                 results=results
             )
             
         except Exception as db_error:
-            # Handle SQL execution errors
+            # Handle SQL execution errors; don't keep serving SQL that failed
+            sql_cache.pop(_normalize_query(request.query), None)
+            if semantic_cache is not None:
+                await semantic_cache.discard(sql_query)
             return QueryResponse(
                 sql=sql_query,
                 results=[],
@@ -78,63 +228,65 @@ async def health_check():
     return {"status": "healthy", "message": "Chat with DB is running"}
 
 @app.get("/api/schema")
-async def get_schema():
+async def get_schema(request: Request):
     """Get database schema information"""
     try:
         schema_info = await db_manager.get_schema_info()
-        return {"schema": schema_info}
+        return _cached_json_response(request, "schema", schema_info, lambda: {"schema": schema_info})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/schema/invalidate")
+async def invalidate_schema():
+    """Drop cached schema and sample data, and all SQL generated against the old schema, in every worker"""
+    db_manager.invalidate_schema()
+    _drop_stale_sql()
+    if semantic_cache is not None:
+        await semantic_cache.clear()
+    return {"status": "invalidated"}
+
 @app.get("/api/sample-data")
-async def get_sample_data():
+async def get_sample_data(request: Request):
     """Get sample data from all tables"""
     try:
         sample_data = await db_manager.get_sample_data()
-        return {"sample_data": sample_data}
+        return _cached_json_response(request, "sample_data", sample_data, lambda: {"sample_data": sample_data})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/data-dictionary")
-async def get_data_dictionary():
+async def get_data_dictionary(request: Request):
     """Get comprehensive data dictionary with business context"""
     try:
-        schema_info = await db_manager.get_schema_info()
-        sample_data = await db_manager.get_sample_data()
+        schema_info, sample_data = await asyncio.gather(
+            db_manager.get_schema_info(),
+            db_manager.get_sample_data()
+        )
         
-        # Generate comprehensive data dictionary using the enhanced schema formatter
-        data_dictionary = sql_generator._format_enhanced_schema_for_prompt(schema_info, sample_data)
+        # Reuse the data dictionary already built for prompts while the schema is unchanged
+        data_dictionary = sql_generator.get_data_dictionary(schema_info, sample_data)
         
-        return {
-            "data_dictionary": data_dictionary,
-            "business_context": {
-                "domain": "STEM Education Program Management",
-                "system_type": "Salesforce-based CRM",
-                "primary_entities": [
-                    "Schools/Organizations (Account)",
-                    "People (Contact)", 
-                    "Program Opportunities (Opportunity)",
-                    "Classes/Workshops (Session)",
-                    "Instructor Scheduling (ProgramInstructorAvailability)"
-                ],
-                "common_use_cases": [
-                    "Find available instructors for specific sessions",
-                    "Track program enrollment and opportunities",
-                    "Manage school partnerships and contacts",
-                    "Schedule STEM classes and workshops",
-                    "Monitor program success and completion rates"
-                ]
-            }
-        }
+        # The body only changes with the data dictionary, so serialize it once per version
+        return _cached_json_response(request, "data_dictionary", data_dictionary, lambda: {
+            "data_dictionary": data_dictionary + _STATIC_TRAILER,
+            "business_context": BUSINESS_CONTEXT
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 if __name__ == "__main__":
     import uvicorn
+    debug = settings.debug
     uvicorn.run(
         "main:app",
-        host=os.getenv("HOST", "0.0.0.0"),
-        port=int(os.getenv("PORT", 8000)),
-        reload=os.getenv("DEBUG", "True").lower() == "true"
+        host=settings.host,
+        port=settings.port,
+        # "auto" picks uvloop and httptools when installed, asyncio/h11 otherwise
+        loop="auto",
+        http="auto",
+        # Reload watches files and forces a single worker, so use it only in development
+        reload=debug,
+        workers=1 if debug else settings.workers or os.cpu_count() or 2,
+        log_level="info" if debug else "warning"
     )
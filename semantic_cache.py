@@ -0,0 +1,261 @@
+import os
+import re
+import time
+import asyncio
+import threading
+import hashlib
+import sqlite3
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import orjson
+from openai import AsyncOpenAI
+
+from config import Settings, get_settings
+
+# Quoted literals, tokens containing digits, and plain words in a question
+_LITERAL_RE = re.compile(r"'[^']*'|\"[^\"]*\"|\w*\d\w*")
+_WORD_RE = re.compile(r"[A-Za-z_]\w*")
+
+
+class SemanticCache:
+    """Serve generated SQL for questions that paraphrase one already answered"""
+    
+    def __init__(self, threshold: float = None, max_entries: int = 1024, ttl: float = None, path: str = None,
+                 database: str = "", dialect: str = "", prompt_version: str = "",
+                 settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.threshold = threshold if threshold is not None else settings.semantic_cache_threshold
+        self.ttl = ttl if ttl is not None else settings.semantic_cache_ttl
+        self.max_entries = max_entries
+        self.model = settings.embedding_model
+        # Persisted SQL is only reused for the same database, dialect and generator prompt
+        self._scope = (database, dialect, prompt_version)
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        
+        # Unit-length question embeddings in a ring buffer, with (fingerprint, sql, stored_at) per row
+        # and the entry's key, so re-storing a question overwrites its row instead of duplicating it
+        self._vectors = None
+        self._entries: List[Optional[Tuple[frozenset, str, float]]] = []
+        self._keys: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._next = 0
+        # Schema name vocabulary used by _fingerprint, as (schema_info, frozenset)
+        self._vocabulary_cache = None
+        
+        # Entries are also kept in SQLite so restarted and sibling workers reuse each other's SQL;
+        # set SEMANTIC_CACHE_PATH to an empty string to keep them in memory only
+        if path is None:
+            path = settings.semantic_cache_path
+        self._db = self._open(path) if path else None
+        self._db_lock = threading.Lock()
+        self._last_rowid = 0
+        # Rows from other workers are pulled at most once per interval, off the event loop
+        self._sync_interval = settings.semantic_cache_sync_interval
+        self._last_sync = time.monotonic()
+        if self._db is not None:
+            self._apply(self._fetch_new_rows())
+    
+    def _open(self, path: str) -> Optional[sqlite3.Connection]:
+        """Open the on-disk store, falling back to memory only if it is unavailable"""
+        path = os.path.expanduser(path)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in db.execute("PRAGMA table_info(entries)")}
+            if columns and not {'model', 'db', 'dialect', 'prompt'} <= columns:
+                # Rows from before their origin was recorded cannot be checked; it is only a cache
+                db.execute("DROP TABLE entries")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "hash TEXT PRIMARY KEY, model TEXT, db TEXT, dialect TEXT, prompt TEXT, dim INTEGER, "
+                "embedding BLOB, fingerprint BLOB, sql TEXT, ts REAL)"
+            )
+            return db
+        except sqlite3.Error:
+            return None
+    
+    def _fetch_new_rows(self) -> list:
+        """Read rows for this embedding model and scope written since the last sync, by this or any other process"""
+        try:
+            with self._db_lock:
+                return self._db.execute(
+                    "SELECT rowid, hash, dim, embedding, fingerprint, sql, ts FROM entries "
+                    "WHERE rowid > ? AND model = ? AND db = ? AND dialect = ? AND prompt = ? AND ts >= ? "
+                    "ORDER BY rowid DESC LIMIT ?",
+                    (self._last_rowid, self.model, *self._scope, time.time() - self.ttl, self.max_entries)
+                ).fetchall()
+        except sqlite3.Error:
+            return []
+    
+    def _apply(self, rows: list):
+        """Add fetched rows to the ring buffer, oldest first"""
+        for rowid, key, dim, embedding, fingerprint, sql, stored_at in reversed(rows):
+            self._last_rowid = max(self._last_rowid, rowid)
+            # Vectors of another size cannot share the buffer
+            if self._vectors is not None and dim != self._vectors.shape[1]:
+                continue
+            self._add(np.frombuffer(embedding, dtype=np.float32),
+                      (frozenset(orjson.loads(fingerprint)), sql, stored_at), key)
+    
+    async def _sync(self):
+        """Pull rows written by other workers, at most once per sync interval"""
+        if self._db is None or time.monotonic() - self._last_sync < self._sync_interval:
+            return
+        self._last_sync = time.monotonic()
+        self._apply(await asyncio.to_thread(self._fetch_new_rows))
+    
+    def _add(self, vector: np.ndarray, entry: Tuple[frozenset, str, float], key: str):
+        """Place an entry in the ring buffer, replacing its earlier copy or else the oldest entry"""
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+        elif len(vector) != self._vectors.shape[1]:
+            return
+        
+        row = self._slots.get(key)
+        if row is None:
+            row = self._next
+            self._next = (row + 1) % self.max_entries
+            if row < len(self._entries):
+                self._slots.pop(self._keys[row], None)
+            else:
+                self._entries.append(None)
+                self._keys.append(None)
+            self._slots[key] = row
+        
+        self._vectors[row] = vector
+        self._entries[row] = entry
+        self._keys[row] = key
+    
+    async def embed(self, query: str) -> Optional[np.ndarray]:
+        """Return the unit-length embedding of a question, or None if the embeddings call fails"""
+        try:
+            response = await self.client.embeddings.create(model=self.model, input=query)
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        except Exception:
+            # The cache is an optimization; never fail the query because of it
+            return None
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector
+    
+    async def lookup(self, query: str, schema_info: Dict[str, Any],
+                     vector: Optional[np.ndarray] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Find cached SQL for a paraphrase of the question.
+        
+        Args:
+            query: Natural language question
+            schema_info: Database schema information
+            vector: Embedding from embed(), if already computed alongside other work
+        
+        Returns:
+            Tuple of (cached SQL or None, question embedding to pass to store())
+        """
+        if vector is None:
+            vector = await self.embed(query)
+            if vector is None:
+                return None, None
+        
+        await self._sync()
+        if self._entries and len(vector) == self._vectors.shape[1]:
+            fingerprint = self._fingerprint(query, schema_info)
+            expired_before = time.time() - self.ttl
+            similarities = self._vectors[:len(self._entries)] @ vector
+            for row in np.argsort(-similarities):
+                if similarities[row] < self.threshold:
+                    break
+                entry = self._entries[row]
+                # Paraphrases must also name the same tables, columns and literals
+                if entry is not None and entry[0] == fingerprint and entry[2] >= expired_before:
+                    return entry[1], vector
+        
+        return None, vector
+    
+    async def store(self, query: str, schema_info: Dict[str, Any], vector: Optional[np.ndarray], sql: str):
+        """Remember the SQL generated for a question, evicting the oldest entry when full"""
+        if vector is None:
+            return
+        fingerprint = self._fingerprint(query, schema_info)
+        entry = (fingerprint, sql, time.time())
+        key = hashlib.blake2b(f"{sorted(fingerprint)}\0{query}".encode(), digest_size=16).hexdigest()
+        self._add(vector, entry, key)
+        
+        if self._db is not None:
+            await asyncio.to_thread(self._write, (
+                key, self.model, *self._scope, len(vector), vector.astype(np.float32).tobytes(),
+                orjson.dumps(sorted(fingerprint)), sql, entry[2]
+            ))
+    
+    def _write(self, row: tuple):
+        """Persist one entry; failures only cost cross-process reuse"""
+        try:
+            with self._db_lock:
+                self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        except sqlite3.Error:
+            pass
+    
+    async def discard(self, sql: str):
+        """Stop serving SQL that turned out to be wrong"""
+        for row, entry in enumerate(self._entries):
+            if entry is not None and entry[1] == sql:
+                self._entries[row] = None
+                self._vectors[row] = 0
+        
+        # Other workers keep their loaded copy until it expires, but never reload it
+        if self._db is not None:
+            await asyncio.to_thread(self._delete, "DELETE FROM entries WHERE sql = ?", (sql,))
+    
+    def reset(self):
+        """Forget the entries held in memory; persisted rows already read are not reloaded"""
+        self._vectors = None
+        self._entries.clear()
+        self._keys.clear()
+        self._slots.clear()
+        self._next = 0
+    
+    async def clear(self):
+        """Forget every entry for this database, in memory and on disk (call after the schema changes)"""
+        self.reset()
+        if self._db is not None:
+            await asyncio.to_thread(self._delete, "DELETE FROM entries WHERE db = ?", (self._scope[0],))
+    
+    def _delete(self, statement: str, params: tuple = ()):
+        """Delete persisted entries; failures only cost cross-process reuse"""
+        try:
+            with self._db_lock:
+                self._db.execute(statement, params)
+        except sqlite3.Error:
+            pass
+    
+    def _get_vocabulary(self, schema_info: Dict[str, Any]) -> frozenset:
+        """Return the lowercased table and column names of a schema, rebuilt only when the schema changes"""
+        cached = self._vocabulary_cache
+        if cached is not None and (cached[0] is schema_info or cached[0] == schema_info):
+            return cached[1]
+        
+        vocabulary = set()
+        for table_name, columns in schema_info.items():
+            vocabulary.add(table_name.lower())
+            vocabulary.update(column['column'].lower() for column in columns)
+        
+        vocabulary = frozenset(vocabulary)
+        self._vocabulary_cache = (schema_info, vocabulary)
+        return vocabulary
+    
+    def _fingerprint(self, query: str, schema_info: Dict[str, Any]) -> frozenset:
+        """Extract the entities a question refers to, so swapped entities never share SQL"""
+        vocabulary = self._get_vocabulary(schema_info)
+        
+        tokens = {literal.lower() for literal in _LITERAL_RE.findall(query)}
+        words = _WORD_RE.findall(query)
+        for position, word in enumerate(words):
+            word_lower = word.lower()
+            if word_lower in vocabulary:
+                tokens.add(word_lower)
+            elif word_lower.endswith('s') and word_lower[:-1] in vocabulary:
+                tokens.add(word_lower[:-1])
+            elif position > 0 and word[0].isupper():
+                # Capitalized words past the first are likely names or places
+                tokens.add(word_lower)
+        
+        return frozenset(tokens)
@@ -6,20 +6,18 @@ This creates the Salesforce database with the 5 required tables and sample data
 
 import pymysql
 import os
-from dotenv import load_dotenv
+from config import get_settings
 
 def create_salesforce_database():
     """Create Salesforce database with required tables"""
     print("🔧 Creating Salesforce database...")
     
-    # Load environment variables
-    load_dotenv()
-    
     # Database connection parameters
-    host = os.getenv("DB_HOST", "localhost")
-    port = int(os.getenv("DB_PORT", 3306))
-    user = os.getenv("DB_USER", "root")
-    password = os.getenv("DB_PASSWORD", "")
+    settings = get_settings()
+    host = settings.db_host
+    port = settings.db_port
+    user = settings.db_user
+    password = settings.db_password
     
     try:
         # Connect to MySQL server (without specifying database)
@@ -49,6 +47,12 @@ def create_salesforce_database():
         )
         
         with connection.cursor() as cursor:
+            # Skip per-row FK/unique validation during the bulk load and keep the
+            # inserts in one transaction; checks are restored before committing
+            cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+            cursor.execute("SET UNIQUE_CHECKS=0")
+            cursor.execute("SET autocommit=0")
+            
             # Create Account table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS Account (
@@ -140,9 +144,15 @@ def create_salesforce_database():
             
             print("✅ All tables created successfully!")
             
+            # Create composite indexes for the agent's common filters and joins
+            create_indexes(cursor)
+            
             # Insert sample data
             insert_sample_data(cursor)
             
+            cursor.execute("SET UNIQUE_CHECKS=1")
+            cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+            
         connection.commit()
         connection.close()
         
@@ -152,6 +162,26 @@ def create_salesforce_database():
         print(f"❌ Error creating Salesforce database: {str(e)}")
         raise
 
+def create_indexes(cursor):
+    """Create secondary indexes, skipping any that already exist"""
+    indexes = [
+        "CREATE INDEX idx_pia_session_avail ON ProgramInstructorAvailability(SessionId, IsAvailable)",
+        "CREATE INDEX idx_pia_contact_avail ON ProgramInstructorAvailability(ContactId, IsAvailable)",
+        "CREATE INDEX idx_opp_stage_close ON Opportunity(StageName, CloseDate)",
+        "CREATE INDEX idx_session_status_start ON Session(Status, StartDateTime)",
+        "CREATE INDEX idx_contact_last_first ON Contact(LastName, FirstName)"
+    ]
+    
+    for statement in indexes:
+        try:
+            cursor.execute(statement)
+        except pymysql.err.OperationalError as e:
+            # MySQL has no CREATE INDEX IF NOT EXISTS; 1061 means the index is already there
+            if e.args[0] != 1061:
+                raise
+    
+    print("✅ Indexes created successfully!")
+
 def insert_sample_data(cursor):
     """Insert sample data into the tables"""
     print("📊 Inserting sample data...")
@@ -163,11 +193,10 @@ def insert_sample_data(cursor):
         ('001000000000003', 'Future Leaders Foundation', 'Partner', 'Non-Profit', '555-0103', 'https://futureleaders.org', '789 Community St', 'Jersey City', 'NJ', '07302', 'USA')
     ]
     
-    for account in accounts:
-        cursor.execute('''
-            INSERT IGNORE INTO Account (Id, Name, Type, Industry, Phone, Website, BillingStreet, BillingCity, BillingState, BillingPostalCode, BillingCountry)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', account)
+    cursor.executemany('''
+        INSERT IGNORE INTO Account (Id, Name, Type, Industry, Phone, Website, BillingStreet, BillingCity, BillingState, BillingPostalCode, BillingCountry)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ''', accounts)
     
     # Insert sample Contacts
     contacts = [
@@ -178,11 +207,10 @@ def insert_sample_data(cursor):
         ('003000000000005', '001000000000001', 'Lisa', 'Thompson', 'lisa.thompson@jerseystem.org', '555-0205', 'STEM Coordinator', 'Education')
     ]
     
-    for contact in contacts:
-        cursor.execute('''
-            INSERT IGNORE INTO Contact (Id, AccountId, FirstName, LastName, Email, Phone, Title, Department)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ''', contact)
+    cursor.executemany('''
+        INSERT IGNORE INTO Contact (Id, AccountId, FirstName, LastName, Email, Phone, Title, Department)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ''', contacts)
     
     # Insert sample Opportunities
     opportunities = [
@@ -191,11 +219,10 @@ def insert_sample_data(cursor):
         ('006000000000003', '001000000000001', 'Equipment Upgrade Initiative', 'Closed Won', 75000.00, '2024-03-31', 100.00, 'Existing Business', 'Internal', 'Upgrading lab equipment for better learning outcomes')
     ]
     
-    for opportunity in opportunities:
-        cursor.execute('''
-            INSERT IGNORE INTO Opportunity (Id, AccountId, Name, StageName, Amount, CloseDate, Probability, Type, LeadSource, Description)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', opportunity)
+    cursor.executemany('''
+        INSERT IGNORE INTO Opportunity (Id, AccountId, Name, StageName, Amount, CloseDate, Probability, Type, LeadSource, Description)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ''', opportunities)
     
     # Insert sample Sessions
     sessions = [
@@ -205,11 +232,10 @@ def insert_sample_data(cursor):
         ('800000000000004', 'AI and Machine Learning', '2024-04-05 09:00:00', '2024-04-05 17:00:00', 'Conference Room', 30, 8, 'Planned', 'Overview of AI concepts and practical applications')
     ]
     
-    for session in sessions:
-        cursor.execute('''
-            INSERT IGNORE INTO Session (Id, Name, StartDateTime, EndDateTime, Location, MaxCapacity, CurrentEnrollment, Status, Description)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', session)
+    cursor.executemany('''
+        INSERT IGNORE INTO Session (Id, Name, StartDateTime, EndDateTime, Location, MaxCapacity, CurrentEnrollment, Status, Description)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ''', sessions)
     
     # Insert sample ProgramInstructorAvailability
     availabilities = [
@@ -220,11 +246,10 @@ def insert_sample_data(cursor):
         ('900000000000005', '003000000000005', '800000000000004', '2024-04-05 08:00:00', '2024-04-05 18:00:00', True, 'Available as backup instructor')
     ]
     
-    for availability in availabilities:
-        cursor.execute('''
-            INSERT IGNORE INTO ProgramInstructorAvailability (Id, ContactId, SessionId, AvailableStartTime, AvailableEndTime, IsAvailable, Notes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''', availability)
+    cursor.executemany('''
+        INSERT IGNORE INTO ProgramInstructorAvailability (Id, ContactId, SessionId, AvailableStartTime, AvailableEndTime, IsAvailable, Notes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ''', availabilities)
     
     print("✅ Sample data inserted successfully!")
     print("📊 Inserted:")
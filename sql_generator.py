@@ -1,31 +1,13 @@
-import os
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from typing import Dict, Any, List, Tuple
-import asyncio
+import re
+import hashlib
+import orjson
+from openai import AsyncOpenAI
+from cachetools import LRUCache
+from typing import Dict, Any, List, Optional, Set, Tuple
 
-class SQLGenerator:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is required")
-        
-        self.llm = ChatOpenAI(
-            temperature=0,
-            model_name="gpt-4o-mini",
-            openai_api_key=self.api_key
-        )
-        
-    
-    async def generate_sql(self, natural_query: str, schema_info: Dict[str, Any], sample_data: Dict[str, Any] = None) -> str:
-        """Generate SQL from natural language query with enhanced context"""
-        schema_prompt = self._format_enhanced_schema_for_prompt(schema_info, sample_data)
-        
-        prompt_template = PromptTemplate(
-            input_variables=["query", "schema"],
-            template="""
-You are a SQL expert for a STEM education program management system. Convert the following natural language query to SQL.
+from config import Settings, get_settings
+
+SYSTEM_PROMPT = """You are a SQL expert for a STEM education program management system. Convert the following natural language query to SQL.
 Use the provided database schema, relationships, and sample data to ensure accurate queries.
 
 BUSINESS CONTEXT:
@@ -66,337 +48,322 @@ QUERY GUIDELINES:
 12. Consider the business context: "teaching" implies active programs, "this semester" implies current semester
 13. Always filter out deleted records with IsDeleted = 0 (FALSE)
 14. For instructor availability, check day-specific time fields like Monday_Start_Time__c, Friday_End_Time__c
+"""
 
-DATABASE SCHEMA WITH RELATIONSHIPS AND SAMPLE DATA:
-{schema}
+# Table relationships and business context - COMPREHENSIVE SALESFORCE SCHEMA
+_TABLE_CONTEXT = {
+    'Account': {
+        'description': 'Organizations, schools, corporations, households, grantmakers, and other groups. Hierarchical with ParentId relationships.',
+        'relationships': ['Contact (1:Many via AccountId)', 'Opportunity (1:Many via AccountId)', 'AccountContactRelation (1:Many)', 'Account (hierarchical via ParentId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'Name': 'Organization name (schools, colleges, companies, ERGs)',
+            'Type': 'Student Organization, Department, Corporate, DEVT, etc.',
+            'Industry': 'Professional Services, Education, etc.',
+            'RecordTypeId': 'Defines account type/department distinctions',
+            'Record_Type_Name__c': 'Human-readable record type (College, Corporate, Community, Household, GrantMaker, Organization)',
+            'ParentId': 'Self-referential hierarchy (ERG → Corporate, Department → University)',
+            'IsDeleted': 'FALSE for active accounts, TRUE for deleted ones'
+        },
+        'record_types': ['College', 'Department', 'Student Organization', 'University', 'Corporate', 'School', 'School District', 'ERG', 'Foundation']
+    },
+    'Contact': {
+        'description': 'People associated with Accounts (employees, donors, teachers, program instructors). Can have multiple Account relationships via AccountContactRelation.',
+        'relationships': ['Account (Many:1 via AccountId - primary)', 'AccountContactRelation (1:Many - secondary relationships)', 'CampaignMember (1:Many)', 'ProgramInstructorAvailability (1:Many)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'FirstName': 'Person\'s first name',
+            'LastName': 'Person\'s last name', 
+            'Title': 'Job title or role (Director, Professor, etc.)',
+            'Department': 'Department within organization',
+            'AccountId': 'Primary Account relationship',
+            'Email': 'Contact email address',
+            'RecordTypeId': 'Role classification',
+            'Record_Type_Name__c': 'Human-readable role (General Contact, Program Instructor, Donor)',
+            'IsDeleted': 'FALSE for active contacts, TRUE for deleted ones'
+        },
+        'record_types': ['General Contact', 'Program Instructor', 'Donor']
+    },
+    'Opportunity': {
+        'description': 'Time-bound or event-specific interactions between Accounts and JerseySTEM (grants, classes, donations)',
+        'relationships': ['Account (Many:1 via AccountId)', 'Session (1:Many via Opportunity__c)', 'ProgramInstructorAvailability (1:Many via Opportunity__c)', 'Deliverable (1:Many)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'Name': 'Opportunity name (donations, programs, etc.)',
+            'StageName': 'Closed Won (active/completed), other stages for pipeline',
+            'Amount': 'Monetary value of opportunity',
+            'CloseDate': 'Date opportunity was/will be closed',
+            'Type': 'Business type classification',
+            'RecordTypeId': 'Opportunity type classification',
+            'Record_Type_Name__c': 'Human-readable type (College, Community, Corporate)',
+            'Semesters__c': 'Semester info like "2024/2025 Fall", "2025/2026 Spring"',
+            'AccountId': 'Links to related organization',
+            'IsDeleted': 'FALSE for active opportunities, TRUE for deleted ones'
+        },
+        'record_types': ['College', 'Community', 'Corporate']
+    },
+    'Session': {
+        'description': 'Individual STEM class sessions linked to program opportunities',
+        'relationships': ['Opportunity (Many:1 via Opportunity__c)', 'ProgramInstructorAvailability (1:Many via Opportunity__c)'],
+        'key_fields': {
+            'Name': 'Session identifier (e.g., SES-000052)',
+            'Session_Date__c': 'Date when the session occurs',
+            'Opportunity__c': 'Links to the related program opportunity',
+            'MMDD__c': 'Month/day format of session date',
+            'Weekday_Short__c': 'Day of week (Mon, Tue, Wed, etc.)',
+            'Session_Activity__c': 'Activity status (Available, etc.)',
+            'IsDeleted': 'FALSE for active sessions, TRUE for deleted ones'
+        }
+    },
+    'ProgramInstructorAvailability': {
+        'description': 'Instructor availability and assignments for program opportunities',
+        'relationships': ['Opportunity (Many:1 via Opportunity__c)', 'Contact (Many:1 via Program_Instructor_s_Contact__c)'],
+        'key_fields': {
+            'Account_Name__c': 'Name of the instructor/person',
+            'Opportunity__c': 'Links to the related program opportunity',
+            'Program_Instructor_s_Contact__c': 'Links to Contact record',
+            'Monday_Start_Time__c': 'Available start time on Monday',
+            'Monday_End_Time__c': 'Available end time on Monday',
+            'Tuesday_Start_Time__c': 'Available start time on Tuesday',
+            'Tuesday_End_Time__c': 'Available end time on Tuesday',
+            'Wednesday_Start_Time__c': 'Available start time on Wednesday',
+            'Wednesday_End_Time__c': 'Available end time on Wednesday',
+            'Thursday_Start_Time__c': 'Available start time on Thursday',
+            'Thursday_End_Time__c': 'Available end time on Thursday',
+            'Friday_Start_Time__c': 'Available start time on Friday',
+            'Friday_End_Time__c': 'Available end time on Friday',
+            'Program_Instructor_Application_Stages__c': 'Application status (Offer Accepted, Offer Declined, etc.)',
+            'Semester_Teaching__c': 'Semester being taught (2024/2025 Fall, etc.)',
+            'IsDeleted': 'FALSE for active records, TRUE for deleted ones'
+        }
+    },
+    'Deliverable': {
+        'description': 'Promises/joint activities/obligations to partners, connected to Opportunities',
+        'relationships': ['Opportunity (Many:1 via OpportunityId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'OpportunityId': 'Links to parent Opportunity',
+            'Type': 'Type of deliverable (field trip, report, newsletter, invitation)',
+            'IsDeleted': 'FALSE for active deliverables, TRUE for deleted ones'
+        }
+    },
+    'Lead': {
+        'description': 'Unqualified prospective Accounts/Contacts/Opportunities, typically from web forms or imports',
+        'relationships': ['Campaign (Many:Many via CampaignMember)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'FirstName': 'Lead\'s first name',
+            'LastName': 'Lead\'s last name',
+            'Company': 'Organization name',
+            'Status': 'Lead qualification status',
+            'Email': 'Contact email address',
+            'IsConverted': 'TRUE if converted to Account/Contact/Opportunity',
+            'IsDeleted': 'FALSE for active leads, TRUE for deleted ones'
+        }
+    },
+    'Campaign': {
+        'description': 'Coordinated outreach efforts (e.g., mass emails)',
+        'relationships': ['Campaign (hierarchical via ParentId)', 'CampaignMember (1:Many)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'Name': 'Campaign name',
+            'Type': 'Campaign type',
+            'Status': 'Campaign status',
+            'ParentId': 'Parent campaign for hierarchy',
+            'IsDeleted': 'FALSE for active campaigns, TRUE for deleted ones'
+        }
+    },
+    'CampaignMember': {
+        'description': 'Join table linking Campaigns to Contacts/Leads; records status of outreach per contact',
+        'relationships': ['Campaign (Many:1 via CampaignId)', 'Contact (Many:1 via ContactId)', 'Lead (Many:1 via LeadId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'CampaignId': 'Links to Campaign',
+            'ContactId': 'Links to Contact (mutually exclusive with LeadId)',
+            'LeadId': 'Links to Lead (mutually exclusive with ContactId)',
+            'Status': 'Member status (Sent, Responded, etc.)',
+            'IsDeleted': 'FALSE for active members, TRUE for deleted ones'
+        }
+    },
+    'Student': {
+        'description': 'Middle school students participating in sessions',
+        'relationships': ['SessionAttendance (1:Many)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'FirstName': 'Student\'s first name',
+            'LastName': 'Student\'s last name',
+            'Grade': 'Student grade level',
+            'School': 'School name',
+            'IsDeleted': 'FALSE for active students, TRUE for deleted ones'
+        }
+    },
+    'SessionAttendance': {
+        'description': 'Join table - one record per person (student/instructor) per session with attendance status',
+        'relationships': ['Session (Many:1 via SessionId)', 'Student (Many:1 via StudentId)', 'Contact (Many:1 via ContactId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'SessionId': 'Links to Session',
+            'StudentId': 'Links to Student (for student attendance)',
+            'ContactId': 'Links to Contact (for instructor attendance)',
+            'AttendanceStatus': 'Attendance status (Present, Absent, etc.)',
+            'IsDeleted': 'FALSE for active records, TRUE for deleted ones'
+        }
+    },
+    'AccountContactRelation': {
+        'description': 'Maps a Contact to multiple Accounts, useful for ERG and College roles (Work-Study Coordinator, etc.)',
+        'relationships': ['Account (Many:1 via AccountId)', 'Contact (Many:1 via ContactId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'AccountId': 'Links to Account',
+            'ContactId': 'Links to Contact',
+            'Roles': 'Role/context data for this relationship',
+            'IsDeleted': 'FALSE for active relations, TRUE for deleted ones'
+        }
+    },
+    'AccountHistory': {
+        'description': 'Track field-level changes over time for Account records',
+        'relationships': ['Account (Many:1 via AccountId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'AccountId': 'Links to Account',
+            'Field': 'Field that was changed',
+            'OldValue': 'Previous field value',
+            'NewValue': 'New field value',
+            'CreatedDate': 'When change occurred'
+        }
+    },
+    'ContactHistory': {
+        'description': 'Track field-level changes over time for Contact records',
+        'relationships': ['Contact (Many:1 via ContactId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'ContactId': 'Links to Contact',
+            'Field': 'Field that was changed',
+            'OldValue': 'Previous field value',
+            'NewValue': 'New field value',
+            'CreatedDate': 'When change occurred'
+        }
+    },
+    'LeadHistory': {
+        'description': 'Track field-level changes over time for Lead records',
+        'relationships': ['Lead (Many:1 via LeadId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'LeadId': 'Links to Lead',
+            'Field': 'Field that was changed',
+            'OldValue': 'Previous field value',
+            'NewValue': 'New field value',
+            'CreatedDate': 'When change occurred'
+        }
+    },
+    'OpportunityHistory': {
+        'description': 'Track field-level changes over time for Opportunity records',
+        'relationships': ['Opportunity (Many:1 via OpportunityId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'OpportunityId': 'Links to Opportunity',
+            'Field': 'Field that was changed',
+            'OldValue': 'Previous field value',
+            'NewValue': 'New field value',
+            'CreatedDate': 'When change occurred'
+        }
+    },
+    'OpportunityPipelineHistory': {
+        'description': 'Weekly snapshot of Opportunity statuses/summary',
+        'relationships': ['Opportunity (Many:1 via OpportunityId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'OpportunityId': 'Links to Opportunity',
+            'SnapshotDate': 'Date of the snapshot',
+            'StageName': 'Stage at time of snapshot',
+            'Amount': 'Amount at time of snapshot'
+        }
+    },
+    'CommunicationLogEntry': {
+        'description': 'Tracks non-email communications with contacts',
+        'relationships': ['Contact (Many:1 via ContactId)', 'Account (Many:1 via AccountId)'],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'ContactId': 'Links to Contact',
+            'AccountId': 'Links to Account',
+            'Subject': 'Communication subject',
+            'Type': 'Communication type (Phone, Meeting, etc.)',
+            'Date': 'Communication date',
+            'IsDeleted': 'FALSE for active logs, TRUE for deleted ones'
+        }
+    },
+    'DataDictionaryFields': {
+        'description': 'Metadata for fields—used for dynamic UI/data dictionaries',
+        'relationships': [],
+        'key_fields': {
+            'Id': '18-character Salesforce key (Primary Key)',
+            'ObjectName': 'Salesforce object/table name',
+            'FieldName': 'Field name',
+            'FieldLabel': 'Human-readable field label',
+            'FieldType': 'Field data type',
+            'Description': 'Field description'
+        }
+    }
+}
 
-Natural language query: {query}
 
-SQL Query:
-"""
-        )
-        
-        chain = LLMChain(llm=self.llm, prompt=prompt_template)
-        
-        try:
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                chain.run,
-                {"query": natural_query, "schema": schema_prompt}
-            )
-            
-            # Clean up the result
-            sql = result.strip()
-            if sql.startswith("```sql"):
-                sql = sql[6:]
-            if sql.endswith("```"):
-                sql = sql[:-3]
-            
-            return sql.strip()
-            
-        except Exception as e:
-            raise Exception(f"Failed to generate SQL: {str(e)}")
+def _render_table_header(table_name: str, context: Dict[str, Any]) -> str:
+    """Render the title, purpose and relationships lines that open a table's schema section"""
+    header = f"\n=== {table_name} Table ===\n"
+    if context.get('description'):
+        header += f"Purpose: {context['description']}\n"
     
-    def _format_enhanced_schema_for_prompt(self, schema_info: Dict[str, Any], sample_data: Dict[str, Any] = None) -> str:
-        """Format enhanced schema information with relationships, business context, and sample data"""
-        schema_text = ""
-        
-        # Define table relationships and business context - COMPREHENSIVE SALESFORCE SCHEMA
-        table_context = {
-            'Account': {
-                'description': 'Organizations, schools, corporations, households, grantmakers, and other groups. Hierarchical with ParentId relationships.',
-                'relationships': ['Contact (1:Many via AccountId)', 'Opportunity (1:Many via AccountId)', 'AccountContactRelation (1:Many)', 'Account (hierarchical via ParentId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'Name': 'Organization name (schools, colleges, companies, ERGs)',
-                    'Type': 'Student Organization, Department, Corporate, DEVT, etc.',
-                    'Industry': 'Professional Services, Education, etc.',
-                    'RecordTypeId': 'Defines account type/department distinctions',
-                    'Record_Type_Name__c': 'Human-readable record type (College, Corporate, Community, Household, GrantMaker, Organization)',
-                    'ParentId': 'Self-referential hierarchy (ERG → Corporate, Department → University)',
-                    'IsDeleted': 'FALSE for active accounts, TRUE for deleted ones'
-                },
-                'record_types': ['College', 'Department', 'Student Organization', 'University', 'Corporate', 'School', 'School District', 'ERG', 'Foundation']
-            },
-            'Contact': {
-                'description': 'People associated with Accounts (employees, donors, teachers, program instructors). Can have multiple Account relationships via AccountContactRelation.',
-                'relationships': ['Account (Many:1 via AccountId - primary)', 'AccountContactRelation (1:Many - secondary relationships)', 'CampaignMember (1:Many)', 'ProgramInstructorAvailability (1:Many)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'FirstName': 'Person\'s first name',
-                    'LastName': 'Person\'s last name', 
-                    'Title': 'Job title or role (Director, Professor, etc.)',
-                    'Department': 'Department within organization',
-                    'AccountId': 'Primary Account relationship',
-                    'Email': 'Contact email address',
-                    'RecordTypeId': 'Role classification',
-                    'Record_Type_Name__c': 'Human-readable role (General Contact, Program Instructor, Donor)',
-                    'IsDeleted': 'FALSE for active contacts, TRUE for deleted ones'
-                },
-                'record_types': ['General Contact', 'Program Instructor', 'Donor']
-            },
-            'Opportunity': {
-                'description': 'Time-bound or event-specific interactions between Accounts and JerseySTEM (grants, classes, donations)',
-                'relationships': ['Account (Many:1 via AccountId)', 'Session (1:Many via Opportunity__c)', 'ProgramInstructorAvailability (1:Many via Opportunity__c)', 'Deliverable (1:Many)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'Name': 'Opportunity name (donations, programs, etc.)',
-                    'StageName': 'Closed Won (active/completed), other stages for pipeline',
-                    'Amount': 'Monetary value of opportunity',
-                    'CloseDate': 'Date opportunity was/will be closed',
-                    'Type': 'Business type classification',
-                    'RecordTypeId': 'Opportunity type classification',
-                    'Record_Type_Name__c': 'Human-readable type (College, Community, Corporate)',
-                    'Semesters__c': 'Semester info like "2024/2025 Fall", "2025/2026 Spring"',
-                    'AccountId': 'Links to related organization',
-                    'IsDeleted': 'FALSE for active opportunities, TRUE for deleted ones'
-                },
-                'record_types': ['College', 'Community', 'Corporate']
-            },
-            'Session': {
-                'description': 'Individual STEM class sessions linked to program opportunities',
-                'relationships': ['Opportunity (Many:1 via Opportunity__c)', 'ProgramInstructorAvailability (1:Many via Opportunity__c)'],
-                'key_fields': {
-                    'Name': 'Session identifier (e.g., SES-000052)',
-                    'Session_Date__c': 'Date when the session occurs',
-                    'Opportunity__c': 'Links to the related program opportunity',
-                    'MMDD__c': 'Month/day format of session date',
-                    'Weekday_Short__c': 'Day of week (Mon, Tue, Wed, etc.)',
-                    'Session_Activity__c': 'Activity status (Available, etc.)',
-                    'IsDeleted': 'FALSE for active sessions, TRUE for deleted ones'
-                }
-            },
-            'ProgramInstructorAvailability': {
-                'description': 'Instructor availability and assignments for program opportunities',
-                'relationships': ['Opportunity (Many:1 via Opportunity__c)', 'Contact (Many:1 via Program_Instructor_s_Contact__c)'],
-                'key_fields': {
-                    'Account_Name__c': 'Name of the instructor/person',
-                    'Opportunity__c': 'Links to the related program opportunity',
-                    'Program_Instructor_s_Contact__c': 'Links to Contact record',
-                    'Monday_Start_Time__c': 'Available start time on Monday',
-                    'Monday_End_Time__c': 'Available end time on Monday',
-                    'Tuesday_Start_Time__c': 'Available start time on Tuesday',
-                    'Tuesday_End_Time__c': 'Available end time on Tuesday',
-                    'Wednesday_Start_Time__c': 'Available start time on Wednesday',
-                    'Wednesday_End_Time__c': 'Available end time on Wednesday',
-                    'Thursday_Start_Time__c': 'Available start time on Thursday',
-                    'Thursday_End_Time__c': 'Available end time on Thursday',
-                    'Friday_Start_Time__c': 'Available start time on Friday',
-                    'Friday_End_Time__c': 'Available end time on Friday',
-                    'Program_Instructor_Application_Stages__c': 'Application status (Offer Accepted, Offer Declined, etc.)',
-                    'Semester_Teaching__c': 'Semester being taught (2024/2025 Fall, etc.)',
-                    'IsDeleted': 'FALSE for active records, TRUE for deleted ones'
-                }
-            },
-            'Deliverable': {
-                'description': 'Promises/joint activities/obligations to partners, connected to Opportunities',
-                'relationships': ['Opportunity (Many:1 via OpportunityId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'OpportunityId': 'Links to parent Opportunity',
-                    'Type': 'Type of deliverable (field trip, report, newsletter, invitation)',
-                    'IsDeleted': 'FALSE for active deliverables, TRUE for deleted ones'
-                }
-            },
-            'Lead': {
-                'description': 'Unqualified prospective Accounts/Contacts/Opportunities, typically from web forms or imports',
-                'relationships': ['Campaign (Many:Many via CampaignMember)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'FirstName': 'Lead\'s first name',
-                    'LastName': 'Lead\'s last name',
-                    'Company': 'Organization name',
-                    'Status': 'Lead qualification status',
-                    'Email': 'Contact email address',
-                    'IsConverted': 'TRUE if converted to Account/Contact/Opportunity',
-                    'IsDeleted': 'FALSE for active leads, TRUE for deleted ones'
-                }
-            },
-            'Campaign': {
-                'description': 'Coordinated outreach efforts (e.g., mass emails)',
-                'relationships': ['Campaign (hierarchical via ParentId)', 'CampaignMember (1:Many)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'Name': 'Campaign name',
-                    'Type': 'Campaign type',
-                    'Status': 'Campaign status',
-                    'ParentId': 'Parent campaign for hierarchy',
-                    'IsDeleted': 'FALSE for active campaigns, TRUE for deleted ones'
-                }
-            },
-            'CampaignMember': {
-                'description': 'Join table linking Campaigns to Contacts/Leads; records status of outreach per contact',
-                'relationships': ['Campaign (Many:1 via CampaignId)', 'Contact (Many:1 via ContactId)', 'Lead (Many:1 via LeadId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'CampaignId': 'Links to Campaign',
-                    'ContactId': 'Links to Contact (mutually exclusive with LeadId)',
-                    'LeadId': 'Links to Lead (mutually exclusive with ContactId)',
-                    'Status': 'Member status (Sent, Responded, etc.)',
-                    'IsDeleted': 'FALSE for active members, TRUE for deleted ones'
-                }
-            },
-            'Student': {
-                'description': 'Middle school students participating in sessions',
-                'relationships': ['SessionAttendance (1:Many)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'FirstName': 'Student\'s first name',
-                    'LastName': 'Student\'s last name',
-                    'Grade': 'Student grade level',
-                    'School': 'School name',
-                    'IsDeleted': 'FALSE for active students, TRUE for deleted ones'
-                }
-            },
-            'SessionAttendance': {
-                'description': 'Join table - one record per person (student/instructor) per session with attendance status',
-                'relationships': ['Session (Many:1 via SessionId)', 'Student (Many:1 via StudentId)', 'Contact (Many:1 via ContactId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'SessionId': 'Links to Session',
-                    'StudentId': 'Links to Student (for student attendance)',
-                    'ContactId': 'Links to Contact (for instructor attendance)',
-                    'AttendanceStatus': 'Attendance status (Present, Absent, etc.)',
-                    'IsDeleted': 'FALSE for active records, TRUE for deleted ones'
-                }
-            },
-            'AccountContactRelation': {
-                'description': 'Maps a Contact to multiple Accounts, useful for ERG and College roles (Work-Study Coordinator, etc.)',
-                'relationships': ['Account (Many:1 via AccountId)', 'Contact (Many:1 via ContactId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'AccountId': 'Links to Account',
-                    'ContactId': 'Links to Contact',
-                    'Roles': 'Role/context data for this relationship',
-                    'IsDeleted': 'FALSE for active relations, TRUE for deleted ones'
-                }
-            },
-            'AccountHistory': {
-                'description': 'Track field-level changes over time for Account records',
-                'relationships': ['Account (Many:1 via AccountId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'AccountId': 'Links to Account',
-                    'Field': 'Field that was changed',
-                    'OldValue': 'Previous field value',
-                    'NewValue': 'New field value',
-                    'CreatedDate': 'When change occurred'
-                }
-            },
-            'ContactHistory': {
-                'description': 'Track field-level changes over time for Contact records',
-                'relationships': ['Contact (Many:1 via ContactId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'ContactId': 'Links to Contact',
-                    'Field': 'Field that was changed',
-                    'OldValue': 'Previous field value',
-                    'NewValue': 'New field value',
-                    'CreatedDate': 'When change occurred'
-                }
-            },
-            'LeadHistory': {
-                'description': 'Track field-level changes over time for Lead records',
-                'relationships': ['Lead (Many:1 via LeadId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'LeadId': 'Links to Lead',
-                    'Field': 'Field that was changed',
-                    'OldValue': 'Previous field value',
-                    'NewValue': 'New field value',
-                    'CreatedDate': 'When change occurred'
-                }
-            },
-            'OpportunityHistory': {
-                'description': 'Track field-level changes over time for Opportunity records',
-                'relationships': ['Opportunity (Many:1 via OpportunityId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'OpportunityId': 'Links to Opportunity',
-                    'Field': 'Field that was changed',
-                    'OldValue': 'Previous field value',
-                    'NewValue': 'New field value',
-                    'CreatedDate': 'When change occurred'
-                }
-            },
-            'OpportunityPipelineHistory': {
-                'description': 'Weekly snapshot of Opportunity statuses/summary',
-                'relationships': ['Opportunity (Many:1 via OpportunityId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'OpportunityId': 'Links to Opportunity',
-                    'SnapshotDate': 'Date of the snapshot',
-                    'StageName': 'Stage at time of snapshot',
-                    'Amount': 'Amount at time of snapshot'
-                }
-            },
-            'CommunicationLogEntry': {
-                'description': 'Tracks non-email communications with contacts',
-                'relationships': ['Contact (Many:1 via ContactId)', 'Account (Many:1 via AccountId)'],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'ContactId': 'Links to Contact',
-                    'AccountId': 'Links to Account',
-                    'Subject': 'Communication subject',
-                    'Type': 'Communication type (Phone, Meeting, etc.)',
-                    'Date': 'Communication date',
-                    'IsDeleted': 'FALSE for active logs, TRUE for deleted ones'
-                }
-            },
-            'DataDictionaryFields': {
-                'description': 'Metadata for fields—used for dynamic UI/data dictionaries',
-                'relationships': [],
-                'key_fields': {
-                    'Id': '18-character Salesforce key (Primary Key)',
-                    'ObjectName': 'Salesforce object/table name',
-                    'FieldName': 'Field name',
-                    'FieldLabel': 'Human-readable field label',
-                    'FieldType': 'Field data type',
-                    'Description': 'Field description'
-                }
-            }
-        }
-        
-        for table_name, columns in schema_info.items():
-            context = table_context.get(table_name, {})
-            
-            schema_text += f"\n=== {table_name} Table ===\n"
-            if context.get('description'):
-                schema_text += f"Purpose: {context['description']}\n"
-            
-            if context.get('relationships'):
-                schema_text += f"Relationships: {', '.join(context['relationships'])}\n"
-            
-            schema_text += "Columns:\n"
-            for col in columns:
-                key_info = f" (PRIMARY KEY)" if col['key'] == 'PRI' else f" (FOREIGN KEY)" if col['key'] == 'MUL' else ""
-                nullable_info = "" if col['nullable'] == 'YES' else " NOT NULL"
-                
-                # Add business context for key fields
-                field_context = ""
-                if table_name in table_context and col['column'] in table_context[table_name].get('key_fields', {}):
-                    field_context = f" - {table_context[table_name]['key_fields'][col['column']]}"
-                
-                schema_text += f"  • {col['column']}: {col['type']}{key_info}{nullable_info}{field_context}\n"
-            
-            # Add sample data if available
-            if sample_data and table_name in sample_data and sample_data[table_name]:
-                schema_text += f"\nSample {table_name} records:\n"
-                sample_records = sample_data[table_name][:3]  # Show up to 3 sample records
-                for i, record in enumerate(sample_records, 1):
-                    schema_text += f"  Example {i}: "
-                    # Show key fields from sample data
-                    key_values = []
-                    for key_field in ['Id', 'Name', 'Title', 'StageName', 'Status', 'IsAvailable']:
-                        if key_field in record and record[key_field] is not None:
-                            key_values.append(f"{key_field}='{record[key_field]}'")
-                    schema_text += ", ".join(key_values[:3]) + "\n"
-            
-            schema_text += "\n"
-        
-        # Add comprehensive JOIN patterns and business logic
-        schema_text += """
+    if context.get('relationships'):
+        header += f"Relationships: {', '.join(context['relationships'])}\n"
+    return header
+
+# Table headers never change, so render them once at import
+_TABLE_HEADERS = {table_name: _render_table_header(table_name, context)
+                  for table_name, context in _TABLE_CONTEXT.items()}
+
+# Sample record fields shown in the prompt, and the longest value shown for each
+_SAMPLE_KEYS = ('Id', 'Name', 'Title', 'StageName', 'Status', 'IsAvailable')
+_SAMPLE_VALUE_CHARS = 60
+
+_NAME_PART_RE = re.compile(r"[A-Z]?[a-z]+")
+_QUERY_WORD_RE = re.compile(r"[A-Za-z_]\w*")
+
+def _stem(word: str) -> str:
+    """Crudely singularize a lowercase word so 'schools' and 'school' share a key"""
+    if word.endswith('__c'):
+        word = word[:-3]
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ses', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+def _build_table_keywords() -> Dict[str, Set[str]]:
+    """Map words from table names and descriptions to the tables they point at"""
+    keywords: Dict[str, Set[str]] = {}
+    for table_name, context in _TABLE_CONTEXT.items():
+        words = _NAME_PART_RE.findall(table_name) + _NAME_PART_RE.findall(context.get('description', ''))
+        for word in words:
+            if len(word) >= 4:
+                keywords.setdefault(_stem(word.lower()), set()).add(table_name)
+    
+    # Words shared by many tables ("records", "track", "time") say nothing about which one is meant,
+    # while a table's own name always points at that table alone
+    keywords = {word: tables for word, tables in keywords.items() if len(tables) <= 3}
+    for table_name in _TABLE_CONTEXT:
+        keywords[_stem(table_name.lower())] = {table_name}
+    return keywords
+
+_TABLE_KEYWORDS = _build_table_keywords()
+
+# Tables each table joins to directly, from the leading name of each relationship
+_TABLE_NEIGHBORS = {table_name: tuple(rel.split(' ', 1)[0] for rel in context.get('relationships', []))
+                    for table_name, context in _TABLE_CONTEXT.items()}
+
+# Comprehensive JOIN patterns and business logic, sent with the system prompt
+_STATIC_TRAILER = """
 COMMON JOIN PATTERNS:
 • Account → Contact: JOIN Contact ON Contact.AccountId = Account.Id
 • Account → Opportunity: JOIN Opportunity ON Opportunity.AccountId = Account.Id  
@@ -634,13 +601,193 @@ SALESFORCE-SPECIFIC CONSIDERATIONS:
 • Audit trails: Use *History tables for change tracking and compliance
 • Data quality: Use DataDictionaryFields for dynamic field metadata and validation
 """
-        
-        return schema_text
 
-    def _format_schema_for_prompt(self, schema_info: Dict[str, Any]) -> str:
-        """Legacy method - kept for backward compatibility"""
-        return self._format_enhanced_schema_for_prompt(schema_info)
+# Everything that is the same for every request goes in the system message, so it forms one
+# byte-identical prefix long enough for provider-side prompt caching
+_SYSTEM_MESSAGE = SYSTEM_PROMPT + _STATIC_TRAILER
+
+MODEL_NAME = "gpt-4o-mini"
+
+# Changes whenever the model or the static prompt does, so SQL cached under an older prompt is not reused
+PROMPT_VERSION = hashlib.blake2b(f"{MODEL_NAME}\0{_SYSTEM_MESSAGE}".encode(), digest_size=8).hexdigest()
+
+# Structured output: the model replies with {"sql": "..."} and nothing else
+_SQL_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "sql_query",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"sql": {"type": "string"}},
+            "required": ["sql"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Opening ```/```sql fence and closing ``` fence in model output
+_FENCE_RE = re.compile(r"^\s*```(?:sql)?[ \t]*\n?|\n?```\s*$", re.IGNORECASE)
+
+
+class SQLGenerator:
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.api_key = settings.openai_api_key
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is required")
+        
+        self.client = AsyncOpenAI(api_key=self.api_key)
+        # Smaller schemas always get the full data dictionary: the text saved by detailing only
+        # the tables a question names is small, and the keyword match can miss a table
+        self.table_selection_min_tables = settings.table_selection_min_tables
+        
+        # Formatted data dictionaries as (schema_info, sample_data, {table subset: text})
+        self._dictionary_cache = None
+        # Question word -> tables lookup for the current schema, as (schema_info, vocabulary)
+        self._vocabulary_cache = None
     
+    def get_data_dictionary(self, schema_info: Dict[str, Any], sample_data: Dict[str, Any] = None,
+                            tables: Optional[Tuple[str, ...]] = None) -> str:
+        """Return the formatted data dictionary for all tables or a subset, reusing text while schema and samples are unchanged"""
+        cached = self._dictionary_cache
+        if cached is None or not (
+                (cached[0] is schema_info or cached[0] == schema_info) and
+                (cached[1] is sample_data or cached[1] == sample_data)):
+            cached = (schema_info, sample_data, LRUCache(maxsize=64))
+            self._dictionary_cache = cached
+        
+        text = cached[2].get(tables)
+        if text is None:
+            if tables is None:
+                text = self._format_enhanced_schema_for_prompt(schema_info, sample_data)
+            else:
+                # Name every table so the model knows the full universe, but detail only the selected ones
+                text = (f"All tables: {', '.join(schema_info)}\n"
+                        f"Detailed below are the tables this question refers to and the tables they join to.\n" +
+                        self._format_enhanced_schema_for_prompt(
+                            {table_name: schema_info[table_name] for table_name in tables}, sample_data))
+            cached[2][tables] = text
+        return text
     
+    def _select_tables(self, natural_query: str, schema_info: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+        """Pick the tables a question mentions plus the tables they join to, or None to keep every table"""
+        if len(schema_info) < self.table_selection_min_tables:
+            return None
+        
+        vocabulary = self._get_vocabulary(schema_info)
+        words = [_stem(word.lower()) for word in _QUERY_WORD_RE.findall(natural_query)]
+        
+        selected = set()
+        # Adjacent pairs catch multi-word table names such as "account history"
+        for word in words + [first + second for first, second in zip(words, words[1:])]:
+            selected.update(vocabulary.get(word, ()))
+        if not selected:
+            return None
+        
+        for table_name in list(selected):
+            selected.update(_TABLE_NEIGHBORS.get(table_name, ()))
+        tables = tuple(table_name for table_name in schema_info if table_name in selected)
+        return tables if len(tables) < len(schema_info) else None
+    
+    def _get_vocabulary(self, schema_info: Dict[str, Any]) -> Dict[str, Set[str]]:
+        """Map question words to tables via table keywords and columns that only a few tables have"""
+        cached = self._vocabulary_cache
+        if cached is not None and (cached[0] is schema_info or cached[0] == schema_info):
+            return cached[1]
+        
+        column_tables: Dict[str, Set[str]] = {}
+        for table_name, columns in schema_info.items():
+            for col in columns:
+                column_tables.setdefault(_stem(col['column'].lower()), set()).add(table_name)
+        
+        vocabulary = {word: tables for word, tables in column_tables.items() if len(tables) <= 2}
+        for table_name in schema_info:
+            vocabulary[_stem(table_name.lower())] = {table_name}
+        for word, tables in _TABLE_KEYWORDS.items():
+            tables = {table_name for table_name in tables if table_name in schema_info}
+            if tables:
+                vocabulary[word] = tables
+        
+        self._vocabulary_cache = (schema_info, vocabulary)
+        return vocabulary
     
+    async def generate_sql(self, natural_query: str, schema_info: Dict[str, Any], sample_data: Dict[str, Any] = None) -> str:
+        """Generate SQL from natural language query with enhanced context"""
+        tables = self._select_tables(natural_query, schema_info)
+        schema_prompt = self.get_data_dictionary(schema_info, sample_data, tables)
+        
+        try:
+            # Static instructions and join patterns first, then the (memoized) data dictionary, which
+            # only varies per question when a table subset is selected, and the question last
+            response = await self.client.chat.completions.create(
+                model=MODEL_NAME,
+                temperature=0,
+                response_format=_SQL_RESPONSE_FORMAT,
+                messages=[
+                    {"role": "system", "content": _SYSTEM_MESSAGE},
+                    {"role": "user", "content": f"DATABASE SCHEMA WITH RELATIONSHIPS AND SAMPLE DATA:\n{schema_prompt}"},
+                    {"role": "user", "content": f"Natural language query: {natural_query}\n\nSQL Query:"}
+                ]
+            )
+            
+            text = response.choices[0].message.content or ""
+            try:
+                return orjson.loads(text)["sql"].strip()
+            except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+                # Fall back to fenced plain text if structured output is unavailable
+                return _FENCE_RE.sub("", text).strip()
+            
+        except Exception as e:
+            raise Exception(f"Failed to generate SQL: {str(e)}")
+    
+    def _format_enhanced_schema_for_prompt(self, schema_info: Dict[str, Any], sample_data: Dict[str, Any] = None) -> str:
+        """Format enhanced schema information with relationships, business context, and sample data"""
+        parts: List[str] = ["Column flags: PK = primary key, FK = foreign key, NN = not null\n"]
+        
+        for table_name, columns in schema_info.items():
+            context = _TABLE_CONTEXT.get(table_name, {})
+            parts.append(_TABLE_HEADERS.get(table_name) or _render_table_header(table_name, context))
+            
+            # Annotated columns get a line each; the rest share one comma-separated line,
+            # with flags abbreviated so repeated words like NOT NULL stay out of the prompt
+            key_fields = context.get('key_fields', {})
+            described, plain = [], []
+            for col in columns:
+                column_name, key = col['column'], col['key']
+                column_text = f"{column_name} {col['type']}"
+                if key == 'PRI':
+                    column_text += " PK"
+                elif key == 'MUL':
+                    column_text += " FK"
+                if col['nullable'] != 'YES':
+                    column_text += " NN"
+                
+                # Add business context for key fields
+                field_context = key_fields.get(column_name)
+                if field_context:
+                    described.append(f"  • {column_text} - {field_context}\n")
+                else:
+                    plain.append(column_text)
+            
+            parts.append("Columns:\n")
+            parts.extend(described)
+            if plain:
+                parts.append(f"  • Other: {', '.join(plain)}\n")
+            
+            # Add sample data if available
+            if sample_data and table_name in sample_data and sample_data[table_name]:
+                parts.append(f"\nSample {table_name} records:\n")
+                sample_records = sample_data[table_name][:3]  # Show up to 3 sample records
+                for i, record in enumerate(sample_records, 1):
+                    # Show the first few key fields, with long values cut short
+                    key_values = [f"{key_field}='{str(record[key_field])[:_SAMPLE_VALUE_CHARS]}'"
+                                  for key_field in _SAMPLE_KEYS if record.get(key_field) is not None]
+                    parts.append(f"  Example {i}: {', '.join(key_values[:3])}\n")
+            
+            parts.append("\n")
+        
+        return "".join(parts)
     
+    # Legacy name - kept for backward compatibility
+    _format_schema_for_prompt = _format_enhanced_schema_for_prompt
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from config import Settings
+from database import DatabaseManager
+
+
+class ExecuteQueryTest(unittest.TestCase):
+    """Read/write detection in DatabaseManager.execute_query against SQLite"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE Account (Id TEXT PRIMARY KEY, Name TEXT)")
+        conn.executemany("INSERT INTO Account VALUES (?, ?)", [("1", "A"), ("2", "B")])
+        conn.commit()
+        conn.close()
+        
+        self.db = DatabaseManager(Settings(use_sqlite=True, db_name=self.db_path))
+    
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+    
+    def run_query(self, sql):
+        return asyncio.run(self.db.execute_query(sql))
+    
+    def test_cte_select_returns_rows_and_is_cached(self):
+        sql = "WITH x AS (SELECT Name FROM Account) SELECT Name FROM x ORDER BY Name"
+        self.assertEqual(self.run_query(sql), [{"Name": "A"}, {"Name": "B"}])
+        self.assertEqual(len(self.db._query_cache), 1)
+        
+        # Served from the cache: the row inserted behind the manager's back is not seen
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO Account VALUES ('3', 'C')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.run_query(sql), [{"Name": "A"}, {"Name": "B"}])
+    
+    def test_cte_delete_commits_and_clears_cache(self):
+        self.run_query("SELECT Name FROM Account")
+        self.assertEqual(len(self.db._query_cache), 1)
+        
+        result = self.run_query("WITH x AS (SELECT Id FROM Account WHERE Name = 'A') "
+                                "DELETE FROM Account WHERE Id IN (SELECT Id FROM x)")
+        self.assertEqual(result[0]["affected_rows"], 1)
+        self.assertEqual(len(self.db._query_cache), 0)
+        
+        # Committed: visible from an independent connection
+        conn = sqlite3.connect(self.db_path)
+        names = [row[0] for row in conn.execute("SELECT Name FROM Account ORDER BY Name")]
+        conn.close()
+        self.assertEqual(names, ["B"])
+    
+    def test_whitespace_inside_literals_keeps_queries_apart(self):
+        self.run_query("INSERT INTO Account VALUES ('3', 'A  B')")
+        self.assertEqual(self.run_query("SELECT Id FROM Account WHERE Name = 'A  B'"), [{"Id": "3"}])
+        self.assertEqual(self.run_query("SELECT Id FROM Account WHERE Name = 'A B'"), [])
+    
+    def test_returning_write_commits_and_is_not_cached(self):
+        sql = "INSERT INTO Account VALUES ('3', 'C') RETURNING Id"
+        self.assertEqual(self.run_query(sql), [{"Id": "3"}])
+        self.assertEqual(len(self.db._query_cache), 0)
+        
+        # Committed and not holding the write lock: another connection can see and write the row
+        conn = sqlite3.connect(self.db_path, timeout=0)
+        conn.execute("UPDATE Account SET Name = 'D' WHERE Id = '3'")
+        conn.commit()
+        conn.close()
+        
+        # Running it again reaches the database instead of replaying the cached row
+        with self.assertRaises(Exception):
+            self.run_query(sql)
+
+
+
+class SampleDataTest(unittest.TestCase):
+    """Sample data is only cached once every table has loaded"""
+    
+    def test_missing_tables_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "test.db")
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE Account (Id TEXT PRIMARY KEY, Name TEXT)")
+            conn.close()
+            db = DatabaseManager(Settings(use_sqlite=True, db_name=path))
+            try:
+                sample_data = asyncio.run(db.get_sample_data())
+                self.assertEqual(sample_data["Contact"], [])
+                self.assertIsNone(db._sample_cache)
+            finally:
+                db.close()
+    
+    def test_unreachable_mysql_raises_and_is_not_cached(self):
+        db = DatabaseManager(Settings(db_host="127.0.0.1", db_port=1))
+        try:
+            with self.assertRaises(Exception):
+                asyncio.run(db.get_sample_data())
+            self.assertIsNone(db._sample_cache)
+        finally:
+            db.close()
+
+
+
+class InvalidationTest(unittest.TestCase):
+    """invalidate_schema in one worker reaches the caches of the others"""
+    
+    def test_invalidation_reaches_other_managers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "test.db")
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE Account (Id TEXT PRIMARY KEY, Name TEXT)")
+            conn.close()
+            
+            workers = [DatabaseManager(Settings(use_sqlite=True, db_name=path)) for _ in range(2)]
+            try:
+                for db in workers:
+                    db._schema_cache_path = os.path.join(tmpdir, "schema.pkl")
+                    db._invalidation_path = os.path.join(tmpdir, "invalidated")
+                    db._invalidation_stamp = db._read_invalidation_stamp()
+                    asyncio.run(db.get_schema_info())
+                    asyncio.run(db.execute_query("SELECT Name FROM Account"))
+                
+                first, second = workers
+                version = second.schema_version()
+                first.invalidate_schema()
+                self.assertIsNotNone(second._schema_cache)
+                
+                self.assertNotEqual(second.schema_version(), version)
+                self.assertIsNone(second._schema_cache)
+                self.assertEqual(len(second._query_cache), 0)
+            finally:
+                for db in workers:
+                    db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
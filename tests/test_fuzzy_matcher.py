@@ -0,0 +1,68 @@
+import unittest
+
+from fuzzy_matcher import FuzzyColumnMatcher
+
+
+SCHEMA = {
+    "Account": [
+        {"column": "Id", "type": "varchar", "nullable": "NO", "key": "PRI"},
+        {"column": "Name", "type": "varchar", "nullable": "YES", "key": ""},
+        {"column": "Foo__c", "type": "varchar", "nullable": "YES", "key": ""},
+        {"column": "Start_Date__c", "type": "date", "nullable": "YES", "key": ""},
+    ],
+}
+
+
+class CustomSuffixTest(unittest.TestCase):
+    """The Salesforce __c suffix is stripped the same way on every indexing path"""
+    
+    def test_custom_field_tokens_agree(self):
+        matcher = FuzzyColumnMatcher()
+        index = matcher._get_column_index(SCHEMA)
+        position = index.columns.index("Foo__c")
+        
+        self.assertEqual(index.column_parts[position], ("foo",))
+        searchable = matcher._create_searchable_text("Foo__c", "Account")
+        self.assertNotIn(" c ", f" {searchable} ")
+        self.assertIn("foo", searchable.split())
+        
+        position = index.columns.index("Start_Date__c")
+        self.assertEqual(index.column_parts[position], ("start", "date"))
+        searchable = matcher._create_searchable_text("Start_Date__c", "Account")
+        self.assertIn("start date", searchable)
+        self.assertIn("startdate", searchable.split())
+
+
+
+class ValidateSqlColumnsTest(unittest.TestCase):
+    """Batch-scoring unknown columns gives the same verdict as matching each one alone"""
+    
+    def test_batched_suggestions_match_per_column_matching(self):
+        schema = dict(SCHEMA, Contact=[
+            {"column": "Id", "type": "varchar", "nullable": "NO", "key": "PRI"},
+            {"column": "Email", "type": "varchar", "nullable": "YES", "key": ""},
+            {"column": "AccountId", "type": "varchar", "nullable": "YES", "key": "MUL"},
+        ])
+        sql = "SELECT Nmae, Emial, StartDate, Foo FROM Contact WHERE AcountId = '1' ORDER BY Nmae"
+        
+        is_valid, suggestions = FuzzyColumnMatcher().validate_sql_columns(sql, schema)
+        
+        expected = []
+        for column in ["Nmae", "Emial", "StartDate", "Foo", "AcountId", "Nmae"]:
+            matches = FuzzyColumnMatcher().find_column_matches(column, schema, top_n=3)
+            if matches and matches[0].similarity_score < 95:
+                expected.append(f"Potential issue with column '{column}':")
+                expected.extend(
+                    f"  • Did you mean {match.table_name}.{match.matched_column}? "
+                    f"(similarity: {match.similarity_score:.1f}%)"
+                    for match in matches
+                )
+                expected.append("")
+        
+        self.assertTrue(expected)
+        self.assertFalse(is_valid)
+        self.assertEqual(suggestions, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from config import get_settings
+
+# main builds its components from the settings at import time; keep the test values out of other tests
+_tmpdir = tempfile.TemporaryDirectory()
+with mock.patch.dict(os.environ, {
+    "OPENAI_API_KEY": "test",
+    "USE_SQLITE": "true",
+    "DB_NAME": os.path.join(_tmpdir.name, "test.db"),
+    "SEMANTIC_CACHE": "false",
+}):
+    get_settings.cache_clear()
+    import main
+get_settings.cache_clear()
+
+
+SCHEMA = {"Account": [{"column": "Id", "type": "varchar", "nullable": "NO", "key": "PRI"}]}
+
+
+def tearDownModule():
+    _tmpdir.cleanup()
+
+
+class GenerateSqlCachedTest(unittest.TestCase):
+    """Concurrent identical questions share one LLM call"""
+    
+    def setUp(self):
+        main.sql_cache.clear()
+        self.calls = 0
+        
+        async def generate_sql(query, schema_info, sample_data=None):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return "SELECT Id FROM Account"
+        
+        patches = [
+            mock.patch.object(main.db_manager, "get_schema_info", mock.AsyncMock(return_value=SCHEMA)),
+            mock.patch.object(main.db_manager, "get_sample_data", mock.AsyncMock(return_value={})),
+            mock.patch.object(main.sql_generator, "generate_sql", generate_sql),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+    
+    def test_concurrent_identical_questions_make_one_call(self):
+        async def ask():
+            return await asyncio.gather(*(main.generate_sql_cached(query) for query in
+                                          ["List accounts", "list  accounts", " List Accounts"]))
+        
+        self.assertEqual(asyncio.run(ask()), ["SELECT Id FROM Account"] * 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(main._sql_locks, {})
+    
+    def test_different_questions_make_separate_calls(self):
+        async def ask():
+            return await asyncio.gather(main.generate_sql_cached("List accounts"),
+                                        main.generate_sql_cached("Count accounts"))
+        
+        asyncio.run(ask())
+        self.assertEqual(self.calls, 2)
+
+
+class ETagTest(unittest.TestCase):
+    """Read-only endpoints answer a matching If-None-Match with 304"""
+    
+    def setUp(self):
+        patch = mock.patch.object(main.db_manager, "get_schema_info", mock.AsyncMock(return_value=SCHEMA))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = TestClient(main.app)
+    
+    def test_matching_etag_gets_304(self):
+        first = self.client.get("/api/schema")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json(), {"schema": SCHEMA})
+        etag = first.headers["ETag"]
+        
+        second = self.client.get("/api/schema", headers={"If-None-Match": etag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.headers["ETag"], etag)
+        self.assertEqual(second.content, b"")
+    
+    def test_stale_etag_gets_body(self):
+        response = self.client.get("/api/schema", headers={"If-None-Match": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"schema": SCHEMA})
+
+
+if __name__ == "__main__":
+    unittest.main()
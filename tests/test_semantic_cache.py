@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from config import Settings
+from semantic_cache import SemanticCache
+
+
+SCHEMA = {
+    "Account": [
+        {"column": "Id", "type": "varchar", "nullable": "NO", "key": "PRI"},
+        {"column": "Name", "type": "varchar", "nullable": "YES", "key": ""},
+        {"column": "BillingCity", "type": "varchar", "nullable": "YES", "key": ""},
+    ],
+}
+
+
+class LookupTest(unittest.TestCase):
+    """Similar embeddings only share SQL when the questions name the same things"""
+    
+    def setUp(self):
+        # Memory only, so tests never touch the shared on-disk store
+        self.cache = SemanticCache(path="", settings=Settings(openai_api_key="test"))
+        self.vector = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    
+    def lookup(self, query, vector):
+        return asyncio.run(self.cache.lookup(query, SCHEMA, vector))[0]
+    
+    def test_paraphrase_hits(self):
+        asyncio.run(self.cache.store("show accounts in 'Boston'", SCHEMA, self.vector, "SQL1"))
+        self.assertEqual(self.lookup("list the accounts in 'Boston'", self.vector), "SQL1")
+    
+    def test_fingerprint_mismatch_misses(self):
+        asyncio.run(self.cache.store("show accounts in 'Boston'", SCHEMA, self.vector, "SQL1"))
+        # Same embedding, but a different literal: the cached SQL would filter on the wrong city
+        self.assertIsNone(self.lookup("show accounts in 'Chicago'", self.vector))
+    
+    def test_dissimilar_question_misses(self):
+        asyncio.run(self.cache.store("show accounts in 'Boston'", SCHEMA, self.vector, "SQL1"))
+        other = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+        self.assertIsNone(self.lookup("show accounts in 'Boston'", other))
+    
+    def test_discarded_sql_misses(self):
+        asyncio.run(self.cache.store("show accounts in 'Boston'", SCHEMA, self.vector, "SQL1"))
+        asyncio.run(self.cache.discard("SQL1"))
+        self.assertIsNone(self.lookup("show accounts in 'Boston'", self.vector))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from config import Settings
+from sql_generator import SQLGenerator, _TABLE_CONTEXT
+
+
+def make_schema():
+    """One small table per documented table, in documentation order"""
+    return {
+        table_name: [
+            {"column": "Id", "type": "varchar", "nullable": "NO", "key": "PRI"},
+            {"column": "Name", "type": "varchar", "nullable": "YES", "key": ""},
+        ]
+        for table_name in _TABLE_CONTEXT
+    }
+
+
+class TableSelectionTest(unittest.TestCase):
+    """Questions detail only the tables they refer to plus the tables those join to"""
+    
+    def setUp(self):
+        self.schema = make_schema()
+        self.generator = SQLGenerator(Settings(openai_api_key="test", table_selection_min_tables=1))
+    
+    def test_selects_named_table_and_its_neighbors(self):
+        tables = self.generator._select_tables("List all campaign members", self.schema)
+        self.assertEqual(set(tables), {"CampaignMember", "Campaign", "Contact", "Lead"})
+    
+    def test_selects_every_named_table(self):
+        tables = self.generator._select_tables("count students who attended sessions", self.schema)
+        self.assertTrue({"Student", "Session", "SessionAttendance"} <= set(tables))
+        self.assertTrue({"Opportunity", "ProgramInstructorAvailability"} <= set(tables))
+        self.assertNotIn("Lead", tables)
+    
+    def test_unrecognized_question_keeps_every_table(self):
+        self.assertIsNone(self.generator._select_tables("show me everything", self.schema))
+    
+    def test_small_schema_keeps_every_table(self):
+        generator = SQLGenerator(Settings(openai_api_key="test"))
+        self.assertIsNone(generator._select_tables("List all campaign members", self.schema))
+    
+    def test_subset_dictionary_lists_all_tables_but_details_the_selection(self):
+        tables = self.generator._select_tables("List all campaign members", self.schema)
+        text = self.generator.get_data_dictionary(self.schema, None, tables)
+        self.assertIn("All tables: " + ", ".join(self.schema), text)
+        self.assertIn("=== CampaignMember Table ===", text)
+        self.assertNotIn("=== Student Table ===", text)
+
+
+if __name__ == "__main__":
+    unittest.main()